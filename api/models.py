@@ -76,12 +76,26 @@ class KnowledgeGraph(BaseModel):
     edges: List[Edge]
 
 
+class Evidence(BaseModel):
+    """Text-mined evidence.
+
+    publication and sentence are indices into the message provenance table.
+    """
+
+    publication: int
+    sentence: int
+    score: float = None
+    subject_spans: str = None
+    object_spans: str = None
+    provided_by: str = None
+
+
 class EdgeBinding(BaseModel):
     """Edge binding."""
 
     qg_id: str
     kg_id: Union[str, List[str]]
-    provenance: str = None
+    provenance: List[Evidence] = None
 
 
 class NodeBinding(BaseModel):
@@ -100,15 +114,40 @@ class Result(BaseModel):
     extra_edges: List[Dict] = None
 
 
+class Provenance(BaseModel):
+    """Publications and sentences referenced by evidence."""
+
+    publications: List[str]
+    sentences: List[str]
+
+
 class Message(BaseModel):
     """Message."""
 
     query_graph: QueryGraph = None
     knowledge_graph: Union[KnowledgeGraph, RemoteKnowledgeGraph] = None
     results: List[Result] = None
+    provenance: Provenance = None
+    next_cursor: str = None
+    profile: Dict = None
+    truncated: bool = None
 
 
 class Query(BaseModel):
     """Query."""
 
     message: Message
+
+
+class JobStatus(BaseModel):
+    """Background query job.
+
+    Times are in seconds since the epoch.
+    """
+
+    id: str
+    status: str
+    submitted: float
+    started: float = None
+    finished: float = None
+    error: str = None
@@ -1,27 +1,82 @@
 """REST portal for CAM-KP RDF database."""
+import asyncio
 from collections import defaultdict
 import json
 import logging
-from typing import List
+from typing import Dict, List
 
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, HTTPException
 import httpx
-from starlette.responses import Response
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
 
-from api.models import Query, Message, QueryGraph
+from api.models import Query, Message, QueryGraph, JobStatus
 from core.transpile import (
     build_query,
     parse_response,
     get_details,
     parse_kgraph,
+    split_curies,
+    fetch_evidence,
+    get_evidence_keys,
     # get_CAM_query,
     # get_CAM_stuff_query,
 )
-from core.utilities import apply_prefix, hash_dict, trim_qgraph, run_query
+from core.utilities import (
+    apply_prefix,
+    hash_dict,
+    trim_qgraph,
+    run_query,
+    stream_query,
+    QUERY_STATS,
+    encode_cursor,
+    decode_cursor,
+    dump_json,
+    unprefix,
+)
+from core.backends import BACKEND
+from core.slot_mapping import SLOT_MAPPING, load_slot_mapping
+from core.planner import load_statistics
+from core.onehop import ONEHOP_ENGINE, load_onehop, answer_onehop
+from core.jobs import JOBS, DONE
+from core.metrics import Gauges, stage, render
+from core.profiling import PROFILE, Profile
+from core.deadlines import (
+    DEADLINE,
+    QUERY_TIMEOUT,
+    Deadline,
+    or_truncated,
+    truncated,
+)
+from core.slowlog import (
+    QGRAPH,
+    SLOW_QUERY_LOG,
+    open_slow_query_log,
+    close_slow_query_log,
+)
+from core.scheduler import (
+    SCHEDULER,
+    Overloaded,
+    BACKEND_RETRY_AFTER,
+    PRIORITY_MAIN,
+    PRIORITY_DETAIL,
+)
+from core.cache import (
+    ResponseCache,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_MAX_BYTES,
+    QUERY_CACHE_TTL,
+)
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.DEBUG)
 
+# how often to check whether the client of a running query went away
+DISCONNECT_POLL_SECONDS = 1
+# backoff between attempts to load the slot mapping at startup
+SLOT_MAPPING_RETRY_SECONDS = 1
+SLOT_MAPPING_MAX_RETRY_SECONDS = 60
+
 app = FastAPI(
     title="Text Mining Provider -- Targeted text-mined association API",
     description="""This REST portal serves Biolink associations that have been mined from the scientific literature. <br> 
@@ -75,6 +130,125 @@ app = FastAPI(
 with open("examples/chebi-pr-regulation.json") as f:
     example = json.load(f)
 
+# final /query messages, keyed by query graph and parameters
+QUERY_CACHE = ResponseCache(
+    max_entries=QUERY_CACHE_MAX_ENTRIES,
+    max_bytes=QUERY_CACHE_MAX_BYTES,
+    ttl=QUERY_CACHE_TTL,
+)
+
+Gauges("query_cache", "/query response cache", QUERY_CACHE.stats)
+Gauges(
+    "backend",
+    "Backend queries",
+    lambda: {**SCHEDULER.stats(), **QUERY_STATS, **BACKEND.stats()},
+)
+Gauges("jobs", "Background jobs", JOBS.stats)
+
+
+class NotReady(Exception):
+    """The slot mapping is not loaded yet."""
+
+
+@app.exception_handler(Overloaded)
+@app.exception_handler(NotReady)
+async def reject_overloaded(request: Request, exc: Exception):
+    """Ask the client to come back later."""
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(BACKEND_RETRY_AFTER)},
+    )
+
+
+def check_ready():
+    """Raise NotReady until the slot mapping is loaded.
+
+    Without it, queries find no edges, and the empty answers would be cached.
+    """
+    if not SLOT_MAPPING["predicates"]:
+        raise NotReady("The slot mapping is not loaded yet")
+
+
+@app.on_event("startup")
+async def open_backend():
+    """Open the SPARQL backend shared by all requests."""
+    await BACKEND.open()
+    # the backend may not be ready yet, keep trying until the mapping is loaded
+    asyncio.ensure_future(refresh_slot_mapping_in_background())
+    # counting the store can take a while, plan without statistics until then
+    asyncio.ensure_future(refresh_statistics_in_background())
+    if ONEHOP_ENGINE:
+        # use SPARQL until the index is loaded
+        asyncio.ensure_future(refresh_onehop_in_background())
+
+
+async def refresh_slot_mapping_in_background():
+    """Load the slot mapping, retrying with backoff until it is not empty.
+
+    Queries find no edges until the mapping is loaded.
+    """
+    delay = SLOT_MAPPING_RETRY_SECONDS
+    while True:
+        try:
+            mapping = await load_slot_mapping()
+            if mapping["predicates"]:
+                # answers may have been cached while the mapping was loading
+                QUERY_CACHE.purge()
+                return
+            LOGGER.warning("The slot mapping is empty, retrying in %s s", delay)
+        except Exception:
+            LOGGER.exception("Failed to load the slot mapping, retrying in %s s", delay)
+        await asyncio.sleep(delay)
+        delay = min(2 * delay, SLOT_MAPPING_MAX_RETRY_SECONDS)
+
+
+async def refresh_statistics_in_background():
+    """Load the query planner statistics, logging failures."""
+    try:
+        await load_statistics()
+    except Exception:
+        LOGGER.exception("Failed to load the query planner statistics")
+
+
+async def refresh_onehop_in_background():
+    """Load the one-hop index, logging failures."""
+    try:
+        await load_onehop()
+    except Exception:
+        LOGGER.exception("Failed to load the one-hop index")
+
+
+@app.on_event("startup")
+async def open_logs():
+    """Open the slow query log, if configured."""
+    if SLOW_QUERY_LOG:
+        open_slow_query_log(SLOW_QUERY_LOG)
+
+
+@app.on_event("startup")
+async def start_jobs():
+    """Start the background job workers."""
+    JOBS.start()
+
+
+@app.on_event("shutdown")
+async def close_backend():
+    """Close the SPARQL backend."""
+    await BACKEND.close()
+
+
+@app.on_event("shutdown")
+async def close_logs():
+    """Close the slow query log."""
+    close_slow_query_log()
+
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    """Stop the background job workers."""
+    await JOBS.stop()
+
 
 # @app.post("/transpile", response_model=str, tags=["query"])
 # async def transpile_query(
@@ -100,26 +274,44 @@ with open("examples/chebi-pr-regulation.json") as f:
 #     return list(trim_qgraph(qgraph.dict()))
 
 
-@app.post("/query", response_model=Message, tags=["query"])
-async def answer_query(
-    query: Query = Body(..., example=example),
-    strict: bool = True,
-    limit: int = -1,
-) -> Message:
-    """Answer biomedical question."""
-    message = query.message.dict()
-    sparql_query = await build_query(message["query_graph"], strict=strict, limit=limit)
-    headers = {"content-type": "application/sparql-query", "Accept": "application/json"}
-    # get results
-    results = await run_query(sparql_query)
-
-    # parse results
-    message["knowledge_graph"], message["results"] = await parse_response(
-        response=results,
-        qgraph=message["query_graph"],
-        strict=strict,
-    )
-    if not results:
+async def execute_query(message, strict=True, limit=-1, offset=None):
+    """Answer a message by running the query pipeline against the backend."""
+    QGRAPH.set(message["query_graph"])
+    evidence = None
+    onehop = None
+    if ONEHOP_ENGINE and limit < 0 and offset is None:
+        with stage("onehop"):
+            onehop = answer_onehop(message["query_graph"], strict=strict)
+    if onehop is not None:
+        # answered from memory, SPARQL is only needed for the details
+        results, evidence = onehop
+    else:
+        with stage("build_query"):
+            sparql_query = await build_query(
+                message["query_graph"], strict=strict, limit=limit, offset=offset
+            )
+        # get results, streaming them into the parser when the answer is unbounded
+        if limit < 0:
+            results = stream_query(sparql_query, priority=PRIORITY_MAIN)
+        else:
+            with stage("main_query"):
+                results = await or_truncated(
+                    run_query(sparql_query, priority=PRIORITY_MAIN), []
+                )
+
+    # parse results, including the streamed main query and the evidence queries
+    with stage("parse_response"):
+        (
+            message["knowledge_graph"],
+            message["results"],
+            message["provenance"],
+        ) = await parse_response(
+            response=results,
+            qgraph=message["query_graph"],
+            strict=strict,
+            evidence=evidence,
+        )
+    if not message["results"]:
         message["knowledge_graph"] = {
             "nodes": [],
             "edges": [],
@@ -127,19 +319,416 @@ async def answer_query(
         return message
 
     # get knowledge graph
-    detail_query, slot_query, node_map, edge_map = get_details(
-        message["knowledge_graph"]
-    )
-    response = await run_query(detail_query)
-    slot_response = await run_query(slot_query)
+    with stage("get_details"):
+        detail_query, slot_response, node_map, edge_map = get_details(
+            message["knowledge_graph"]
+        )
+    with stage("detail_query"):
+        response = await or_truncated(
+            run_query(detail_query, priority=PRIORITY_DETAIL), []
+        )
+
+    # parse knowledge graph
+    with stage("parse_kgraph"):
+        message["knowledge_graph"] = parse_kgraph(
+            response=response,
+            slot_response=slot_response,
+            node_map=node_map,
+            edge_map=edge_map,
+            kgraph=message["knowledge_graph"],
+        )
+
+    return message
+
+
+async def execute_batch(messages, strict=True):
+    """Answer many messages, sharing backend queries between them.
+
+    Messages whose query graphs differ only in their pinned CURIEs are
+    answered by one query. Evidence and node details are fetched once for
+    the whole batch.
+    """
+    QGRAPH.set([message["query_graph"] for message in messages])
+    groups = defaultdict(list)
+    for message in messages:
+        shape, curies = split_curies(message["query_graph"])
+        groups[hash_dict(shape)].append((message, curies))
+    groups = list(groups.values())
+
+    async def run_group(group):
+        message, curies = group[0]
+        sparql_query = await build_query(
+            message["query_graph"],
+            strict=strict,
+            curies=[curies for _, curies in group],
+        )
+        return await or_truncated(run_query(sparql_query, priority=PRIORITY_MAIN), [])
+
+    responses = await asyncio.gather(*[run_group(group) for group in groups])
+
+    triples = set()
+    for group, response in zip(groups, responses):
+        triples |= get_evidence_keys(response, group[0][0]["query_graph"])
+    evidence = await fetch_evidence(triples)
+
+    # split the rows back per message and parse them
+    kgraph = {"nodes": {}, "edges": {}}
+    for group, response in zip(groups, responses):
+        curie_ids = list(group[0][1])
+        rows = defaultdict(list)
+        for row in response:
+            key = tuple(row[f"{node_id}_curie"]["value"] for node_id in curie_ids)
+            rows[key].append(row)
+        for message, curies in group:
+            key = tuple(unprefix(curies[node_id]) for node_id in curie_ids)
+            (
+                message["knowledge_graph"],
+                message["results"],
+                message["provenance"],
+            ) = await parse_response(
+                response=rows.get(key, []),
+                qgraph=message["query_graph"],
+                strict=strict,
+                evidence=evidence,
+            )
+            kgraph["nodes"].update(message["knowledge_graph"]["nodes"])
+            kgraph["edges"].update(message["knowledge_graph"]["edges"])
+
+    # get knowledge graph
+    response = []
+    if kgraph["nodes"]:
+        detail_query, _, _, _ = get_details(kgraph)
+        response = await or_truncated(
+            run_query(detail_query, priority=PRIORITY_DETAIL), []
+        )
 
     # parse knowledge graph
-    message["knowledge_graph"] = parse_kgraph(
-        response=response,
-        slot_response=slot_response,
-        node_map=node_map,
-        edge_map=edge_map,
-        kgraph=message["knowledge_graph"],
+    for message in messages:
+        if not message["results"]:
+            message["knowledge_graph"] = {
+                "nodes": [],
+                "edges": [],
+            }
+            continue
+        _, slot_response, node_map, edge_map = get_details(message["knowledge_graph"])
+        message["knowledge_graph"] = parse_kgraph(
+            response=response,
+            slot_response=slot_response,
+            node_map=node_map,
+            edge_map=edge_map,
+            kgraph=message["knowledge_graph"],
+        )
+
+    return messages
+
+
+def is_int(value):
+    """Check whether a decoded JSON value is an integer."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def get_deadline(timeout=None):
+    """Get the deadline for answering a request, if any."""
+    if timeout is not None and timeout <= 0:
+        raise HTTPException(status_code=400, detail="Timeout must be positive")
+    if timeout is None:
+        timeout = QUERY_TIMEOUT
+    return Deadline(timeout) if timeout > 0 else None
+
+
+async def until_disconnected(request, awaitable):
+    """Await, cancelling the work if the client disconnects first."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if request is not None and await request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        task.cancel()
+
+
+@app.post("/query", response_model=Message, tags=["query"])
+async def answer_query(
+    query: Query = Body(..., example=example),
+    strict: bool = True,
+    limit: int = -1,
+    offset: int = None,
+    cursor: str = None,
+    fast: bool = False,
+    profile: bool = False,
+    timeout: float = None,
+    request: Request = None,
+) -> Message:
+    """Answer biomedical question.
+
+    To page through the answers, pass limit and offset (e.g. offset=0), then
+    pass the next_cursor of each response as cursor to get the next page.
+
+    With fast=true the response is serialized directly, without being
+    validated against the Message model. It has the same fields, with unset
+    optional ones null.
+
+    With profile=true the answer is computed afresh, and the response includes
+    where the time went: per stage and per backend query.
+
+    Backend queries still running after timeout seconds (default: the server's
+    QUERY_TIMEOUT) are cancelled, and the answer found so far is returned,
+    marked as truncated.
+    """
+    message = query.message.dict()
+    query_id = hash_dict({"query_graph": message["query_graph"], "strict": strict})
+    if cursor is not None:
+        try:
+            page = decode_cursor(cursor)
+        except ValueError as err:
+            raise HTTPException(status_code=400, detail=str(err))
+        if page.get("query", None) != query_id:
+            raise HTTPException(
+                status_code=400, detail="Cursor does not belong to this query"
+            )
+        offset, limit = page.get("offset", None), page.get("limit", None)
+        if not (is_int(offset) and offset >= 0 and is_int(limit) and limit > 0):
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    if offset is not None and offset < 0:
+        raise HTTPException(status_code=400, detail="Offset must not be negative")
+    deadline = get_deadline(timeout)
+
+    cache_key = hash_dict(
+        {
+            "query_graph": message["query_graph"],
+            "strict": strict,
+            "limit": limit,
+            "offset": offset,
+        }
     )
+    cached = None if profile else QUERY_CACHE.get(cache_key)
+    if cached is not None:
+        if fast:
+            return Response(cached, media_type="application/json")
+        return json.loads(cached)
 
+    check_ready()
+    # turn new work away early rather than queue it behind a saturated backend
+    SCHEDULER.admit()
+    recorder = Profile() if profile else None
+    profile_token = PROFILE.set(recorder)
+    deadline_token = DEADLINE.set(deadline)
+    try:
+        message = await until_disconnected(
+            request,
+            execute_query(message, strict=strict, limit=limit, offset=offset),
+        )
+        if truncated():
+            message["truncated"] = True
+    finally:
+        DEADLINE.reset(deadline_token)
+        PROFILE.reset(profile_token)
+    if offset is not None and limit > 0 and len(message["results"]) == limit:
+        # there may be more
+        message["next_cursor"] = encode_cursor(
+            {"query": query_id, "offset": offset + limit, "limit": limit}
+        )
+    payload = dump_json(message)
+    if not message.get("truncated", False):
+        QUERY_CACHE.put(cache_key, payload)
+    if recorder is not None:
+        message["profile"] = recorder.dict()
+        payload = dump_json(message)
+    if fast:
+        # the message is built to the schema, so skip validating it again
+        return Response(payload, media_type="application/json")
     return message
+
+
+@app.post("/query/batch", response_model=List[Message], tags=["query"])
+async def answer_batch(
+    queries: List[Query] = Body(..., example=[example]),
+    strict: bool = True,
+    timeout: float = None,
+    request: Request = None,
+) -> List[Message]:
+    """Answer many biomedical questions at once.
+
+    Questions that differ only in their node CURIEs are answered together,
+    which is much faster than asking them one by one. The timeout applies to
+    the whole batch, as for /query. Nodes may pin one CURIE each, not a list.
+    """
+    deadline = get_deadline(timeout)
+    messages = [query.message.dict() for query in queries]
+    for message in messages:
+        for node in message["query_graph"]["nodes"]:
+            if isinstance(node.get("curie", None), list):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Node {node['id']} has a list of CURIEs, "
+                    "which batches do not support",
+                )
+    cache_keys = [
+        hash_dict(
+            {
+                "query_graph": message["query_graph"],
+                "strict": strict,
+                "limit": -1,
+                "offset": None,
+            }
+        )
+        for message in messages
+    ]
+    answers = [QUERY_CACHE.get(cache_key) for cache_key in cache_keys]
+    answers = [None if answer is None else json.loads(answer) for answer in answers]
+    missing = [idx for idx, answer in enumerate(answers) if answer is None]
+    if missing:
+        check_ready()
+        # turn new work away early rather than queue it behind a saturated backend
+        SCHEDULER.admit()
+        token = DEADLINE.set(deadline)
+        try:
+            await until_disconnected(
+                request,
+                execute_batch([messages[idx] for idx in missing], strict=strict),
+            )
+            # a truncated batch query may have cut any of its answers short
+            is_truncated = truncated()
+        finally:
+            DEADLINE.reset(token)
+    for idx in missing:
+        if is_truncated:
+            messages[idx]["truncated"] = True
+        else:
+            QUERY_CACHE.put(cache_keys[idx], dump_json(messages[idx]))
+        answers[idx] = messages[idx]
+    return answers
+
+
+async def run_job(message, strict=True, limit=-1):
+    """Answer a message for a background job, through the response cache."""
+    cache_key = hash_dict(
+        {
+            "query_graph": message["query_graph"],
+            "strict": strict,
+            "limit": limit,
+            "offset": None,
+        }
+    )
+    payload = QUERY_CACHE.get(cache_key)
+    if payload is None:
+        check_ready()
+        message = await execute_query(message, strict=strict, limit=limit)
+        payload = dump_json(message)
+        QUERY_CACHE.put(cache_key, payload)
+    return payload
+
+
+@app.post("/jobs", response_model=JobStatus, status_code=202, tags=["jobs"])
+async def submit_job(
+    query: Query = Body(..., example=example),
+    strict: bool = True,
+    limit: int = -1,
+) -> JobStatus:
+    """Answer biomedical question in the background.
+
+    Poll /jobs/{job_id} until the job is done, then get the answer from
+    /jobs/{job_id}/result.
+    """
+    job_id = JOBS.submit(run_job, query.message.dict(), strict=strict, limit=limit)
+    return JOBS.get(job_id)
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus, tags=["jobs"])
+async def get_job(job_id: str) -> JobStatus:
+    """Get the status of a background job."""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+
+@app.get("/jobs/{job_id}/result", response_model=Message, tags=["jobs"])
+async def get_job_result(job_id: str) -> Message:
+    """Get the answer of a finished background job."""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    if job["status"] != DONE:
+        raise HTTPException(
+            status_code=409,
+            detail=job["error"] or f"Job is {job['status']}",
+        )
+    # the message was built to the schema when the job ran
+    return Response(job["result"], media_type="application/json")
+
+
+@app.post("/admin/slot_mapping", tags=["admin"])
+async def refresh_slot_mapping() -> Dict[str, int]:
+    """Reload the biolink slot to predicate mapping from the backend."""
+    mapping = await load_slot_mapping()
+    # cached answers may have been built from the old mapping
+    QUERY_CACHE.purge()
+    return {
+        "slots": len(mapping["predicates"]),
+        "predicates": len(mapping["slots"]),
+    }
+
+
+@app.post("/admin/statistics", tags=["admin"])
+async def refresh_statistics() -> Dict[str, int]:
+    """Reload the query planner statistics from the backend."""
+    statistics = await load_statistics()
+    return {
+        "instances": statistics["instances"],
+        "classes": len(statistics["classes"]),
+        "predicates": len(statistics["predicates"]),
+    }
+
+
+@app.post("/admin/onehop", tags=["admin"])
+async def refresh_onehop() -> Dict[str, int]:
+    """Reload the in-memory one-hop index from the backend."""
+    index = await load_onehop()
+    return {
+        "associations": len(index),
+        "evidence": len(index.score),
+    }
+
+
+@app.get("/admin/cache", tags=["admin"])
+async def get_cache_stats() -> Dict[str, int]:
+    """Get the /query response cache statistics."""
+    return QUERY_CACHE.stats()
+
+
+@app.delete("/admin/cache", tags=["admin"])
+async def purge_cache() -> Dict[str, int]:
+    """Remove all entries from the /query response cache."""
+    return {"purged": QUERY_CACHE.purge()}
+
+
+@app.get("/admin/jobs", tags=["admin"])
+async def get_job_stats() -> Dict[str, int]:
+    """Get the number of background jobs in each state."""
+    return JOBS.stats()
+
+
+@app.get("/admin/backend", tags=["admin"])
+async def get_backend_stats() -> Dict[str, int]:
+    """Get the backend query statistics."""
+    return {
+        **SCHEDULER.stats(),
+        **QUERY_STATS,
+        **BACKEND.stats(),
+    }
+
+
+@app.get("/admin/replicas", tags=["admin"])
+async def get_replica_stats() -> List[Dict]:
+    """Get the health and latency statistics of each Blazegraph replica."""
+    return BACKEND.replica_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["admin"])
+async def get_metrics() -> str:
+    """Get the metrics in the Prometheus text exposition format."""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
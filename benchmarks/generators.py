@@ -0,0 +1,157 @@
+"""Synthetic data in the shape of backend/sample.nt.
+
+Chemicals (CHEBI) regulate gene products (PR). Every association is a pair
+of blank nodes typed by the chemical and gene product classes, so the same
+(chemical, predicate, gene product) triple recurs across many rows.
+"""
+import json
+
+from core.transpile import get_details
+
+OBO = "http://purl.obolibrary.org/obo/"
+BIOLINK = "https://w3id.org/biolink/vocab/"
+PREDICATES = [OBO + "RO_0002212", OBO + "RO_0002213"]
+SLOTS = {
+    OBO + "RO_0002212": BIOLINK + "negatively_regulates_entity_to_entity",
+    OBO + "RO_0002213": BIOLINK + "positively_regulates_entity_to_entity",
+}
+
+# the one-hop query graph of examples/chebi-pr-regulation.json, without curies
+QGRAPH = {
+    "nodes": [
+        {"id": "n0", "type": "chemical_substance"},
+        {"id": "n1", "type": "gene_product"},
+    ],
+    "edges": [
+        {
+            "id": "e0",
+            "source_id": "n0",
+            "target_id": "n1",
+            "type": "negatively_regulates_entity_to_entity",
+        }
+    ],
+}
+
+
+def make_chain_qgraph(n_edges):
+    """Make a query graph that is a path of n_edges typed edges."""
+    return {
+        "nodes": [
+            {"id": f"n{idx}", "type": "chemical_substance" if idx % 2 else "gene"}
+            for idx in range(n_edges + 1)
+        ],
+        "edges": [
+            {
+                "id": f"e{idx}",
+                "source_id": f"n{idx}",
+                "target_id": f"n{idx + 1}",
+                "type": "negatively_regulates_entity_to_entity",
+            }
+            for idx in range(n_edges)
+        ],
+    }
+
+
+def make_rows(n_rows):
+    """Make SPARQL bindings answering QGRAPH, with n_rows rows."""
+    n_chemicals = n_rows // 4 + 1
+    n_genes = n_rows // 3 + 1
+    rows = []
+    for idx in range(n_rows):
+        association = f"_:{idx:027x}"
+        rows.append(
+            {
+                "e0": {"type": "uri", "value": PREDICATES[idx % 2]},
+                "n0": {"type": "uri", "value": association + "_subj"},
+                "n0_type": {
+                    "type": "uri",
+                    "value": f"{OBO}CHEBI_{idx % n_chemicals}",
+                },
+                "n1": {"type": "uri", "value": association + "_obj"},
+                "n1_type": {
+                    "type": "uri",
+                    "value": f"{OBO}PR_{idx * 7 % n_genes:09d}",
+                },
+            }
+        )
+    return rows
+
+
+def make_evidence(rows, per_triple=2):
+    """Make evidence query bindings for the distinct triples in rows."""
+    triples = {
+        (row["n0_type"]["value"], row["e0"]["value"], row["n1_type"]["value"])
+        for row in rows
+    }
+    evidence = []
+    for idx, (subj_type, pred, obj_type) in enumerate(sorted(triples)):
+        for jdx in range(per_triple):
+            evidence.append(
+                {
+                    "subj_type": {"value": subj_type},
+                    "pred": {"value": pred},
+                    "obj_type": {"value": obj_type},
+                    "publications": {"value": f"PMID:{idx * per_triple + jdx}"},
+                    "score": {"value": "0.99956816"},
+                    "sentence": {"value": f"sentence {idx} about {subj_type}"},
+                    "subject_spans": {"value": "start: 31, end: 42"},
+                    "object_spans": {"value": "start: 104, end: 110"},
+                    "provided_by": {"value": "TMProvider"},
+                }
+            )
+    return evidence
+
+
+def make_kgraph(n_nodes):
+    """Make a kgraph of chemical -> gene product edges with its detail rows."""
+    kgraph = {"nodes": {}, "edges": {}}
+    response = []
+    for idx in range(n_nodes):
+        if idx % 2:
+            kid = f"PR:{idx:09d}"
+            classes = ["GeneProduct", "GeneOrGeneProduct"]
+        else:
+            kid = f"CHEBI:{idx}"
+            classes = ["ChemicalSubstance"]
+        kgraph["nodes"][kid] = {"id": kid}
+        iri = f"{OBO}{kid.replace(':', '_')}"
+        for blclass in classes:
+            response.append(
+                {
+                    "kid": {"value": iri},
+                    "blclass": {"value": f"{BIOLINK}{blclass}"},
+                    "label": {"value": f"label {idx}"},
+                }
+            )
+    ids = list(kgraph["nodes"])
+    for idx in range(0, n_nodes - 1, 2):
+        edge_id = f"edge{idx}"
+        kgraph["edges"][edge_id] = {
+            "id": edge_id,
+            "type": "RO:0002212" if idx % 4 else "RO:0002213",
+            "source_id": ids[idx],
+            "target_id": ids[idx + 1],
+        }
+    _, _, node_map, edge_map = get_details(kgraph)
+    slot_response = [
+        {
+            "qid": {"value": qid},
+            "kid": {"value": PREDICATES[0]},
+            "blslot": {"value": SLOTS[PREDICATES[0]]},
+        }
+        for qid in edge_map
+    ]
+    return kgraph, response, slot_response, node_map, edge_map
+
+
+def make_results(rows, results_format):
+    """Serialize IRI-only bindings as a SPARQL JSON or TSV results body."""
+    variables = list(rows[0]) if rows else []
+    if results_format == "json":
+        return json.dumps(
+            {"head": {"vars": variables}, "results": {"bindings": rows}}
+        ).encode("utf-8")
+    lines = ["\t".join("?" + variable for variable in variables)]
+    for row in rows:
+        lines.append("\t".join(f"<{row[variable]['value']}>" for variable in variables))
+    return ("\n".join(lines) + "\n").encode("utf-8")
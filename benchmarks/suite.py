@@ -0,0 +1,267 @@
+"""Benchmark the transpile pipeline on synthetic data.
+
+Run from the repository root:
+
+    python -m benchmarks.suite
+
+Each case is timed over a few runs, keeping the best and the slowest, and its
+peak traced memory is measured in a separate run. Results are written to JSON
+and compared with benchmarks/baseline.json; the exit status is 1 if any case's
+best time is slower than the baseline's slowest, or its memory bigger than the
+baseline's, by more than the tolerance, again when it is measured a second
+time. Pass --update-baseline to record a new baseline, with the same --repeat.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from benchmarks.generators import (
+    QGRAPH,
+    make_chain_qgraph,
+    make_evidence,
+    make_kgraph,
+    make_results,
+    make_rows,
+    OBO,
+)
+from core.backends import RESULTS_FORMATS
+from core.transpile import build_query, get_details, parse_kgraph, parse_response
+from core.utilities import PREFIX_MAP, apply_prefix, hash_dict
+
+BASELINE = "benchmarks/baseline.json"
+ROW_SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+EDGE_SIZES = [1, 10, 100]
+# cases at least this big are timed at most this many times
+LARGE = 100000
+LARGE_REPEAT = 3
+# differences below these are noise, as short cases jitter by several ms from
+# run to run
+FLOORS = {"seconds": 0.05, "peak_bytes": 2**16}
+# metric -> the baseline value it must not exceed
+LIMITS = {"seconds": "seconds_max", "peak_bytes": "peak_bytes"}
+# bytes per chunk of a streamed backend response
+CHUNK_SIZE = 2**16
+
+
+def prepare_build_query(n_edges):
+    """Build the query for a path of n_edges edges."""
+    qgraph = make_chain_qgraph(n_edges)
+    return lambda: asyncio.run(build_query(qgraph))
+
+
+def prepare_parse_response(n_rows):
+    """Parse n_rows rows, with evidence from a mocked backend."""
+    rows = make_rows(n_rows)
+    evidence = make_evidence(rows)
+
+    def run():
+        # all the evidence comes back for the first batch
+        responses = iter([evidence])
+
+        async def run_query(query, **kwargs):
+            return next(responses, [])
+
+        with patch("core.transpile.run_query", run_query):
+            asyncio.run(parse_response(rows, QGRAPH))
+
+    return run
+
+
+def prepare_get_details(n_nodes):
+    """Build the detail query for a kgraph of n_nodes nodes."""
+    kgraph = make_kgraph(n_nodes)[0]
+    return lambda: get_details(kgraph)
+
+
+def prepare_parse_kgraph(n_nodes):
+    """Parse the details of a kgraph of n_nodes nodes."""
+    kgraph, response, slot_response, node_map, edge_map = make_kgraph(n_nodes)
+    return lambda: parse_kgraph(response, slot_response, node_map, edge_map, kgraph)
+
+
+def prepare_apply_prefix(n_iris):
+    """Compress n_iris distinct IRIs, starting from a cold cache."""
+    iris = [f"{OBO}CHEBI_{idx}" for idx in range(n_iris)]
+    PREFIX_MAP.compress.cache_clear()
+    return lambda: [apply_prefix(iri) for iri in iris]
+
+
+def prepare_hash_dict(n_dicts):
+    """Hash n_dicts knowledge graph edges."""
+    edges = [
+        {
+            "type": "RO:0002212",
+            "source_id": f"CHEBI:{idx}",
+            "target_id": f"PR:{idx:09d}",
+        }
+        for idx in range(n_dicts)
+    ]
+    return lambda: [hash_dict(edge) for edge in edges]
+
+
+def prepare_decode(results_format):
+    """Get the case decoding results bodies of n_rows rows in results_format."""
+
+    def prepare(n_rows):
+        body = make_results(make_rows(n_rows), results_format)
+        _, parse = RESULTS_FORMATS[results_format]
+
+        async def chunks():
+            for idx in range(0, len(body), CHUNK_SIZE):
+                yield body[idx : idx + CHUNK_SIZE]
+
+        async def decode():
+            return [binding async for binding in parse(chunks())]
+
+        return lambda: asyncio.run(decode())
+
+    return prepare
+
+
+# name -> (sizes, prepare); prepare(size) returns the function to measure
+CASES = {
+    "build_query": (EDGE_SIZES, prepare_build_query),
+    "parse_response": (ROW_SIZES, prepare_parse_response),
+    "get_details": (ROW_SIZES, prepare_get_details),
+    "parse_kgraph": (ROW_SIZES, prepare_parse_kgraph),
+    "apply_prefix": (ROW_SIZES, prepare_apply_prefix),
+    "hash_dict": (ROW_SIZES, prepare_hash_dict),
+    "decode_json": (ROW_SIZES, prepare_decode("json")),
+    "decode_tsv": (ROW_SIZES, prepare_decode("tsv")),
+}
+
+
+def measure(prepare, size, repeat):
+    """Get the best and slowest times and the peak traced memory of a case."""
+    times = []
+    for _ in range(min(repeat, LARGE_REPEAT) if size >= LARGE else repeat):
+        function = prepare(size)
+        # as timeit does, so that the garbage left by earlier cases does not
+        # add to the time of this one
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    function = prepare(size)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(times), "seconds_max": max(times), "peak_bytes": peak}
+
+
+def run(cases, max_size, repeat):
+    """Measure the cases up to max_size."""
+    results = {}
+    for name in cases:
+        sizes, prepare = CASES[name]
+        for size in sizes:
+            if size > max_size:
+                continue
+            key = f"{name}[{size}]"
+            results[key] = measure(prepare, size, repeat)
+            print(
+                f"{key:<26} {results[key]['seconds']:>10.4f} s "
+                f"{results[key]['peak_bytes'] / 2 ** 20:>10.2f} MiB",
+                file=sys.stderr,
+            )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Get the cases that are slower or bigger than the baseline allows.
+
+    Times are compared with the baseline's slowest run, so that a case only
+    regresses when it is slower than the spread of the baseline's runs.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric, limit in LIMITS.items():
+            floor = FLOORS[metric]
+            allowed = baseline[key].get(limit, baseline[key][metric])
+            ratio = max(result[metric], floor) / max(allowed, floor)
+            if ratio > 1 + tolerance:
+                regressions.append((key, metric, ratio))
+    return regressions
+
+
+def remeasure(results, regressions, repeat):
+    """Measure the regressed cases again, keeping the better results.
+
+    Other load on the machine slows cases down at random, so a case only
+    regresses if it does so twice.
+    """
+    for key in {key for key, _, _ in regressions}:
+        name, size = key.rstrip("]").split("[")
+        _, prepare = CASES[name]
+        again = measure(prepare, int(size), repeat)
+        results[key] = {
+            metric: min(value, again[metric]) for metric, value in results[key].items()
+        }
+
+
+def main(argv=None):
+    """Run the suite and compare it with the baseline."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("cases", nargs="*", default=list(CASES), help="cases to run")
+    parser.add_argument(
+        "--max-size", type=int, default=LARGE, help="largest size to run"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed relative increase over the baseline",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store the results as the new baseline",
+    )
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": run(args.cases, args.max_size, args.repeat),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}", file=sys.stderr)
+        return 0
+    regressions = compare(report["results"], baseline, args.tolerance)
+    if regressions:
+        remeasure(report["results"], regressions, args.repeat)
+        regressions = compare(report["results"], baseline, args.tolerance)
+    for key, metric, ratio in regressions:
+        print(f"REGRESSION {key} {metric}: {ratio:.2f}x baseline", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,522 @@
+"""SPARQL backends."""
+import asyncio
+import codecs
+from contextlib import asynccontextmanager, contextmanager
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import time
+
+import httpx
+
+try:
+    import pyoxigraph
+except ImportError:
+    pyoxigraph = None
+
+from core.deadlines import DeadlineExceeded, remaining
+from core.metrics import BACKEND_BYTES, REPLICA_ERRORS, REPLICA_QUERY_SECONDS
+from core.profiling import add_bytes
+from core.results import iter_csv_bindings, iter_tsv_bindings
+
+# "backend" matches the Docker container name for the container with the Blazegraph instance
+# "assoc" is the namespace/repository name where the triples have loaded
+BLAZEGRAPH_URL = "http://backend:9999/blazegraph/namespace/assoc/sparql"
+BLAZEGRAPH_HEADERS = {
+    "content-type": "application/sparql-query",
+    "Accept": "application/json",
+}
+# comma-separated endpoints of read-only replicas of the namespace
+BLAZEGRAPH_URLS = [
+    url for url in os.environ.get("BLAZEGRAPH_URLS", BLAZEGRAPH_URL).split(",") if url
+]
+# replica health checks
+BLAZEGRAPH_HEALTH_CHECK_INTERVAL = float(
+    os.environ.get("BLAZEGRAPH_HEALTH_CHECK_INTERVAL", 10)
+)
+BLAZEGRAPH_HEALTH_CHECK_TIMEOUT = float(
+    os.environ.get("BLAZEGRAPH_HEALTH_CHECK_TIMEOUT", 5)
+)
+BLAZEGRAPH_EJECT_AFTER = int(os.environ.get("BLAZEGRAPH_EJECT_AFTER", 3))
+HEALTH_CHECK_QUERY = "ASK {}"
+# connection pool settings for the shared Blazegraph client, per backend host
+BLAZEGRAPH_MAX_CONNECTIONS = int(os.environ.get("BLAZEGRAPH_MAX_CONNECTIONS", 100))
+BLAZEGRAPH_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("BLAZEGRAPH_MAX_KEEPALIVE_CONNECTIONS", 20)
+)
+BLAZEGRAPH_KEEPALIVE_EXPIRY = float(os.environ.get("BLAZEGRAPH_KEEPALIVE_EXPIRY", 30))
+# "http" for Blazegraph, or "embedded" to answer from files loaded in-process
+SPARQL_BACKEND = os.environ.get("SPARQL_BACKEND", "http")
+# comma-separated N-Triples files (.nt or .nt.gz) for the embedded backend
+SPARQL_BACKEND_FILES = os.environ.get("SPARQL_BACKEND_FILES", "")
+# SPARQL results format asked of HTTP backends: "json", "tsv" or "csv"
+SPARQL_RESULTS_FORMAT = os.environ.get("SPARQL_RESULTS_FORMAT", "json")
+XSD_STRING = "http://www.w3.org/2001/XMLSchema#string"
+
+LOGGER = logging.getLogger(__name__)
+
+# long-lived, pooled HTTP clients keyed by backend host
+CLIENTS = {}
+
+
+def get_client(url=BLAZEGRAPH_URL):
+    """Get the shared client for the host serving url, creating it if needed."""
+    host = httpx.URL(url).netloc.decode()
+    if host not in CLIENTS:
+        CLIENTS[host] = httpx.AsyncClient(
+            timeout=None,
+            limits=httpx.Limits(
+                max_connections=BLAZEGRAPH_MAX_CONNECTIONS,
+                max_keepalive_connections=BLAZEGRAPH_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=BLAZEGRAPH_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return CLIENTS[host]
+
+
+async def close_clients():
+    """Close all shared clients."""
+    while CLIENTS:
+        _, client = CLIENTS.popitem()
+        await client.aclose()
+
+
+@asynccontextmanager
+async def backend_client(url=BLAZEGRAPH_URL):
+    """Get the shared client for url, or a one-off client outside of the app."""
+    if CLIENTS:
+        yield get_client(url)
+    else:
+        # no shared client outside of the app, e.g. in scripts
+        async with httpx.AsyncClient(timeout=None) as client:
+            yield client
+
+
+def request_options(results_format="json"):
+    """Get the request headers and timeout for a query.
+
+    The headers ask for results_format, and enforce the current deadline:
+    Blazegraph stops a query after X-BIGDATA-MAX-QUERY-MILLIS.
+    """
+    headers = {**BLAZEGRAPH_HEADERS, "Accept": RESULTS_FORMATS[results_format][0]}
+    seconds = remaining()
+    if seconds is None:
+        return {"headers": headers, "timeout": None}
+    headers["X-BIGDATA-MAX-QUERY-MILLIS"] = str(max(1, int(seconds * 1000)))
+    return {"headers": headers, "timeout": seconds}
+
+
+BINDINGS_START = re.compile(r'"bindings"\s*:\s*\[')
+BINDINGS_SEPARATOR = re.compile(r"[\s,]*")
+
+
+async def iter_bindings(chunks):
+    """Incrementally parse a SPARQL JSON results body.
+
+    chunks is an async iterator of bytes. Each binding is decoded and yielded
+    as soon as it is complete, so the body is never held in memory at once.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = None
+    async for chunk in chunks:
+        buffer += utf8.decode(chunk)
+        if pos is None:
+            # still reading the head
+            match = BINDINGS_START.search(buffer)
+            if match is None:
+                continue
+            pos = match.end()
+        while True:
+            pos = BINDINGS_SEPARATOR.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if buffer[pos] == "]":
+                return
+            try:
+                binding, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # the binding continues in the next chunk
+                break
+            yield binding
+        buffer = buffer[pos:]
+        pos = 0
+    if pos is not None:
+        raise ValueError("SPARQL results ended inside the bindings")
+
+
+async def count_bytes(chunks):
+    """Pass chunks of bytes through, counting them as backend response bytes."""
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        BACKEND_BYTES.inc(size)
+        add_bytes(size)
+
+
+# results format -> (media type, incremental parser of the body's bytes)
+RESULTS_FORMATS = {
+    "json": ("application/json", iter_bindings),
+    "tsv": ("text/tab-separated-values", iter_tsv_bindings),
+    "csv": ("text/csv", iter_csv_bindings),
+}
+
+
+class Backend:
+    """SPARQL endpoint that answers with SPARQL JSON bindings."""
+
+    async def open(self):
+        """Get ready to answer queries."""
+
+    async def close(self):
+        """Release the resources held for answering queries."""
+
+    async def query(self, query, results_format=None):
+        """Run SPARQL query and return the bindings.
+
+        results_format is the format to transfer the results in, if the
+        backend has a choice; SPARQL_RESULTS_FORMAT by default.
+        """
+        raise NotImplementedError
+
+    async def stream(self, query, results_format=None):
+        """Run SPARQL query, yielding bindings as they arrive."""
+        for binding in await self.query(query, results_format):
+            yield binding
+
+    async def explain(self, query):
+        """Get the query plan for SPARQL query, or None if not supported."""
+        return None
+
+    def stats(self):
+        """Get backend specific statistics."""
+        return {}
+
+    def replica_stats(self):
+        """Get the state and statistics of each replica, if any."""
+        return []
+
+
+class HttpBackend(Backend):
+    """Blazegraph, or any SPARQL endpoint, over HTTP."""
+
+    def __init__(self, url=BLAZEGRAPH_URL):
+        """Initialize the backend for the endpoint at url."""
+        self.url = url
+
+    async def open(self):
+        """Open the pooled client."""
+        get_client(self.url)
+
+    async def close(self):
+        """Close the pooled clients."""
+        await close_clients()
+
+    async def query(self, query, results_format=None):
+        """Run SPARQL query and return the bindings."""
+        return await self.query_at(self.url, query, results_format)
+
+    async def stream(self, query, results_format=None):
+        """Run SPARQL query, yielding bindings as they arrive."""
+        async for binding in self.stream_at(self.url, query, results_format):
+            yield binding
+
+    async def explain(self, query):
+        """Get the query plan for SPARQL query."""
+        return await self.explain_at(self.url, query)
+
+    async def query_at(self, url, query, results_format=None):
+        """Run SPARQL query on the endpoint at url and return the bindings."""
+        results_format = results_format or SPARQL_RESULTS_FORMAT
+        if results_format != "json":
+            # parsed line by line as it arrives
+            return [
+                binding async for binding in self.stream_at(url, query, results_format)
+            ]
+        try:
+            async with backend_client(url) as client:
+                response = await client.post(url, data=query, **request_options())
+        except httpx.TimeoutException:
+            raise DeadlineExceeded("The backend query ran out of time")
+        assert response.status_code < 300
+        BACKEND_BYTES.inc(len(response.content))
+        add_bytes(len(response.content))
+        return response.json()["results"]["bindings"]
+
+    async def stream_at(self, url, query, results_format=None):
+        """Run SPARQL query on the endpoint at url, yielding bindings as they arrive."""
+        results_format = results_format or SPARQL_RESULTS_FORMAT
+        _, parse = RESULTS_FORMATS[results_format]
+        try:
+            async with backend_client(url) as client:
+                async with client.stream(
+                    "POST", url, data=query, **request_options(results_format)
+                ) as response:
+                    assert response.status_code < 300
+                    async for binding in parse(count_bytes(response.aiter_bytes())):
+                        yield binding
+        except httpx.TimeoutException:
+            raise DeadlineExceeded("The backend query ran out of time")
+
+    async def explain_at(self, url, query):
+        """Run SPARQL query with Blazegraph's explain parameter and get the plan.
+
+        The plan is the HTML report, which includes the query's run time.
+        """
+        async with backend_client(url) as client:
+            response = await client.post(
+                url,
+                data={"query": query, "explain": "true"},
+            )
+        assert response.status_code < 300
+        return response.text
+
+
+class Replica:
+    """One endpoint of a replica set, with its health and latency statistics."""
+
+    def __init__(self, url):
+        """Initialize a healthy, idle replica."""
+        self.url = url
+        self.healthy = True
+        # consecutive failed health checks
+        self.failures = 0
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    @contextmanager
+    def track(self):
+        """Count a request to the replica for the duration of the block."""
+        self.outstanding += 1
+        self.requests += 1
+        start = time.perf_counter()
+        try:
+            yield
+        except DeadlineExceeded:
+            # the request ran out of time, not the replica's fault
+            raise
+        except Exception:
+            self.errors += 1
+            REPLICA_ERRORS.inc(1, self.url)
+            raise
+        finally:
+            self.outstanding -= 1
+            elapsed = time.perf_counter() - start
+            self.seconds += elapsed
+            REPLICA_QUERY_SECONDS.observe(elapsed, self.url)
+
+    def stats(self):
+        """Get the replica's state and statistics."""
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "mean_seconds": self.seconds / self.requests if self.requests else 0.0,
+        }
+
+
+class ReplicaSetBackend(HttpBackend):
+    """Read-only replicas of the same Blazegraph namespace.
+
+    Each query goes to the healthy replica with the fewest requests in
+    progress, ties broken at random. Replicas are checked in the background:
+    one failing BLAZEGRAPH_EJECT_AFTER checks in a row gets no more queries
+    until it passes a check again. If no replica is healthy, all are tried.
+    """
+
+    def __init__(self, urls):
+        """Initialize the backend for the endpoints at urls."""
+        self.replicas = [Replica(url) for url in urls]
+        self.url = urls[0]
+        self.monitoring = None
+
+    async def open(self):
+        """Open the pooled clients and start the health checks."""
+        for replica in self.replicas:
+            get_client(replica.url)
+        if self.monitoring is None:
+            self.monitoring = asyncio.ensure_future(self.monitor())
+
+    async def close(self):
+        """Stop the health checks and close the pooled clients."""
+        if self.monitoring is not None:
+            self.monitoring.cancel()
+            try:
+                await self.monitoring
+            except asyncio.CancelledError:
+                pass
+            self.monitoring = None
+        await close_clients()
+
+    def choose(self):
+        """Get the replica for the next query."""
+        candidates = [replica for replica in self.replicas if replica.healthy]
+        if not candidates:
+            candidates = self.replicas
+        fewest = min(replica.outstanding for replica in candidates)
+        return random.choice(
+            [replica for replica in candidates if replica.outstanding == fewest]
+        )
+
+    async def query(self, query, results_format=None):
+        """Run SPARQL query on a replica and return the bindings."""
+        replica = self.choose()
+        with replica.track():
+            return await self.query_at(replica.url, query, results_format)
+
+    async def stream(self, query, results_format=None):
+        """Run SPARQL query on a replica, yielding bindings as they arrive."""
+        replica = self.choose()
+        with replica.track():
+            async for binding in self.stream_at(replica.url, query, results_format):
+                yield binding
+
+    async def explain(self, query):
+        """Get the query plan for SPARQL query from a replica."""
+        replica = self.choose()
+        with replica.track():
+            return await self.explain_at(replica.url, query)
+
+    async def check(self, replica):
+        """Check that the replica answers, ejecting or readmitting it."""
+        try:
+            async with backend_client(replica.url) as client:
+                response = await client.post(
+                    replica.url,
+                    headers=BLAZEGRAPH_HEADERS,
+                    data=HEALTH_CHECK_QUERY,
+                    timeout=BLAZEGRAPH_HEALTH_CHECK_TIMEOUT,
+                )
+            passed = response.status_code < 300
+        except httpx.HTTPError:
+            passed = False
+        if passed:
+            if not replica.healthy:
+                LOGGER.info("Readmitting replica %s", replica.url)
+            replica.failures = 0
+            replica.healthy = True
+            return
+        replica.failures += 1
+        if replica.healthy and replica.failures >= BLAZEGRAPH_EJECT_AFTER:
+            LOGGER.warning("Ejecting replica %s", replica.url)
+            replica.healthy = False
+
+    async def check_all(self):
+        """Check all replicas at once."""
+        await asyncio.gather(*[self.check(replica) for replica in self.replicas])
+
+    async def monitor(self):
+        """Check the replicas every BLAZEGRAPH_HEALTH_CHECK_INTERVAL seconds."""
+        while True:
+            try:
+                await self.check_all()
+            except Exception:
+                LOGGER.exception("Failed to check the replicas")
+            await asyncio.sleep(BLAZEGRAPH_HEALTH_CHECK_INTERVAL)
+
+    def stats(self):
+        """Get the number of replicas and of healthy ones."""
+        return {
+            "replicas": len(self.replicas),
+            "healthy_replicas": sum(replica.healthy for replica in self.replicas),
+        }
+
+    def replica_stats(self):
+        """Get the state and statistics of each replica."""
+        return [replica.stats() for replica in self.replicas]
+
+
+class EmbeddedBackend(Backend):
+    """In-process store loaded from N-Triples files.
+
+    The files are loaded when the backend is opened, or by the first query.
+    Queries run in a worker thread.
+    """
+
+    def __init__(self, files):
+        """Initialize the backend for a list of .nt or .nt.gz files."""
+        if pyoxigraph is None:
+            raise RuntimeError("The embedded SPARQL backend requires pyoxigraph")
+        self.files = files
+        self.store = None
+        self.loading = None
+
+    async def open(self):
+        """Load the files, once."""
+        if self.loading is None:
+            self.loading = asyncio.get_running_loop().run_in_executor(None, self.load)
+        await asyncio.shield(self.loading)
+
+    def load(self):
+        """Load the files into a new store."""
+        store = pyoxigraph.Store()
+        for path in self.files:
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rb") as f:
+                # lenient, as the data has IRIs like <_:...>
+                store.bulk_load(f, pyoxigraph.RdfFormat.N_TRIPLES, lenient=True)
+        self.store = store
+
+    async def close(self):
+        """Drop the store."""
+        self.store = None
+        self.loading = None
+
+    async def query(self, query, results_format=None):
+        """Run SPARQL query and return the bindings; there is no transfer format."""
+        await self.open()
+        return await asyncio.get_running_loop().run_in_executor(None, self.run, query)
+
+    def run(self, query):
+        """Run SPARQL query on the store and convert the solutions to bindings."""
+        solutions = self.store.query(query)
+        variables = [variable.value for variable in solutions.variables]
+        bindings = []
+        for solution in solutions:
+            binding = {}
+            for variable, term in zip(variables, solution):
+                if term is not None:
+                    binding[variable] = term_binding(term)
+            bindings.append(binding)
+        return bindings
+
+
+def term_binding(term):
+    """Get the SPARQL JSON binding of an RDF term."""
+    if isinstance(term, pyoxigraph.NamedNode):
+        return {"type": "uri", "value": term.value}
+    if isinstance(term, pyoxigraph.BlankNode):
+        return {"type": "bnode", "value": term.value}
+    binding = {"type": "literal", "value": term.value}
+    if term.language:
+        binding["xml:lang"] = term.language
+    elif term.datatype.value != XSD_STRING:
+        binding["datatype"] = term.datatype.value
+    return binding
+
+
+def create_backend(name=SPARQL_BACKEND, files=SPARQL_BACKEND_FILES):
+    """Create the backend called name, "http" or "embedded"."""
+    if SPARQL_RESULTS_FORMAT not in RESULTS_FORMATS:
+        raise ValueError(f"Unknown SPARQL results format {SPARQL_RESULTS_FORMAT!r}")
+    if name == "http":
+        if len(BLAZEGRAPH_URLS) > 1:
+            return ReplicaSetBackend(BLAZEGRAPH_URLS)
+        return HttpBackend(*BLAZEGRAPH_URLS)
+    if name == "embedded":
+        return EmbeddedBackend([path for path in files.split(",") if path])
+    raise ValueError(f"Unknown SPARQL backend {name!r}")
+
+
+BACKEND = create_backend()
@@ -0,0 +1,70 @@
+"""Response cache."""
+from collections import OrderedDict
+import os
+import time
+
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", 1000))
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("QUERY_CACHE_MAX_BYTES", 256 * 2 ** 20))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", 3600))
+
+
+class ResponseCache:
+    """LRU cache of serialized responses, bounded by entry count and size.
+
+    Entries expire ttl seconds after they are stored.
+    """
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        """Initialize an empty cache."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Get the payload stored for key, or None."""
+        entry = self.entries.get(key, None)
+        if entry is not None and entry[0] < time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, payload):
+        """Store a payload (str or bytes) for key, evicting the oldest entries."""
+        if key in self.entries:
+            self._remove(key)
+        if len(payload) > self.max_bytes or self.max_entries < 1:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, payload)
+        self.size += len(payload)
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+    def purge(self):
+        """Remove all entries and return how many there were."""
+        count = len(self.entries)
+        self.entries.clear()
+        self.size = 0
+        return count
+
+    def stats(self):
+        """Get the cache occupancy and hit/miss counters."""
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _remove(self, key):
+        """Remove the entry for key."""
+        _, payload = self.entries.pop(key)
+        self.size -= len(payload)
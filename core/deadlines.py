@@ -0,0 +1,73 @@
+"""Per-request deadlines."""
+from contextvars import ContextVar
+import math
+import os
+import time
+
+# seconds allowed for answering a /query request, if it does not say; no
+# deadline if 0
+QUERY_TIMEOUT = float(os.environ.get("QUERY_TIMEOUT", 300))
+
+# the deadline of the request being answered, shared with the tasks it starts
+DEADLINE = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time."""
+
+
+class Deadline:
+    """Point in time by which a request must be answered.
+
+    Backend work still outstanding at the deadline is cancelled, and the
+    request is answered with what it has so far, marked as truncated.
+    """
+
+    def __init__(self, seconds):
+        """Start the clock."""
+        self.at = time.monotonic() + seconds
+        self.truncated = False
+
+    def remaining(self):
+        """Get the seconds left, at least 0."""
+        return max(0.0, self.at - time.monotonic())
+
+    def extend(self, deadline):
+        """Move the deadline back to another one, if later; None is never."""
+        self.at = math.inf if deadline is None else max(self.at, deadline.at)
+
+
+def remaining():
+    """Get the seconds left to the current deadline, or None if there is none."""
+    deadline = DEADLINE.get()
+    if deadline is None or deadline.at == math.inf:
+        return None
+    return deadline.remaining()
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current deadline has passed."""
+    if remaining() == 0:
+        raise DeadlineExceeded("The query deadline has passed")
+
+
+def truncate():
+    """Mark the current request as answered in part."""
+    deadline = DEADLINE.get()
+    if deadline is not None:
+        deadline.truncated = True
+
+
+def truncated():
+    """Check whether the current request was answered in part."""
+    deadline = DEADLINE.get()
+    return deadline is not None and deadline.truncated
+
+
+async def or_truncated(awaitable, default):
+    """Await, or get default if the deadline passes, marking the answer truncated."""
+    try:
+        return await awaitable
+    except DeadlineExceeded:
+        truncate()
+        return default
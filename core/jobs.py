@@ -0,0 +1,118 @@
+"""Background jobs."""
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+from core.scheduler import Overloaded
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", 100))
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", 3600))
+
+LOGGER = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobManager:
+    """Run jobs on a fixed pool of workers.
+
+    Submitted jobs wait in a bounded queue. Finished jobs, and their results,
+    are forgotten retention seconds after they finish.
+    """
+
+    def __init__(self, workers, max_queued, retention):
+        """Initialize a stopped manager."""
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.jobs = {}
+        self.queue = None
+        self.tasks = []
+
+    def start(self):
+        """Start the workers."""
+        self.queue = asyncio.Queue(maxsize=self.max_queued)
+        self.tasks = [asyncio.ensure_future(self.work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers, abandoning running and waiting jobs."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def submit(self, function, *args, **kwargs):
+        """Queue a call to the coroutine function and return the job id.
+
+        Raises Overloaded if the queue is full.
+        """
+        self.purge()
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": PENDING,
+            "submitted": time.time(),
+            "started": None,
+            "finished": None,
+            "error": None,
+        }
+        try:
+            self.queue.put_nowait((job, function, args, kwargs))
+        except asyncio.QueueFull:
+            raise Overloaded(f"{self.queue.qsize()} jobs are already waiting")
+        self.jobs[job["id"]] = job
+        return job["id"]
+
+    def get(self, job_id):
+        """Get a job, or None if it is unknown or expired."""
+        self.purge()
+        return self.jobs.get(job_id, None)
+
+    async def work(self):
+        """Run jobs from the queue, forever."""
+        while True:
+            job, function, args, kwargs = await self.queue.get()
+            job["status"] = RUNNING
+            job["started"] = time.time()
+            try:
+                job["result"] = await function(*args, **kwargs)
+                job["status"] = DONE
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                LOGGER.exception("Job %s failed", job["id"])
+                job["status"] = FAILED
+                job["error"] = str(err) or type(err).__name__
+            finally:
+                job["finished"] = time.time()
+                self.queue.task_done()
+
+    def purge(self):
+        """Forget jobs that finished more than retention seconds ago."""
+        expired = time.time() - self.retention
+        for job_id in [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job["finished"] is not None and job["finished"] < expired
+        ]:
+            del self.jobs[job_id]
+
+    def stats(self):
+        """Get the number of jobs in each state."""
+        self.purge()
+        stats = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in self.jobs.values():
+            stats[job["status"]] += 1
+        return stats
+
+
+JOBS = JobManager(
+    workers=JOB_WORKERS,
+    max_queued=JOB_MAX_QUEUED,
+    retention=JOB_RETENTION,
+)
@@ -0,0 +1,156 @@
+"""Metrics in the Prometheus text exposition format."""
+from bisect import bisect_left
+from contextlib import contextmanager
+import time
+
+from core.profiling import PROFILE
+
+# seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# metrics and collectors, in exposition order
+REGISTRY = []
+
+
+def format_labels(names, values, extra=""):
+    """Format a label set, e.g. {stage="build_query"}."""
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter, per label values."""
+
+    def __init__(self, name, help, labels=()):
+        """Initialize and register the counter."""
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, *label_values):
+        """Add amount to the counter."""
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        """Get the exposition lines."""
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in self.values.items():
+            yield f"{self.name}{format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    """Distribution of observed values, per label values."""
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        """Initialize and register the histogram."""
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket and +Inf, sum]
+        self.series = {}
+        REGISTRY.append(self)
+
+    def observe(self, value, *label_values):
+        """Record a value."""
+        series = self.series.get(label_values, None)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        """Record the duration of the block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self):
+        """Get the exposition lines."""
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = format_labels(self.labels, label_values, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Gauges:
+    """Gauges read from a function when the metrics are rendered.
+
+    The function returns a dict of gauge name suffix to value, e.g. the
+    stats() of a cache.
+    """
+
+    def __init__(self, prefix, help, function):
+        """Initialize and register the gauges."""
+        self.prefix = prefix
+        self.help = help
+        self.function = function
+        REGISTRY.append(self)
+
+    def render(self):
+        """Get the exposition lines."""
+        for key, value in self.function().items():
+            name = f"{self.prefix}_{key}"
+            yield f"# HELP {name} {self.help} ({key})"
+            yield f"# TYPE {name} gauge"
+            yield f"{name} {value}"
+
+
+def render():
+    """Get all metrics in the text exposition format."""
+    return "".join(line + "\n" for metric in REGISTRY for line in metric.render())
+
+
+STAGE_SECONDS = Histogram(
+    "query_stage_seconds",
+    "Time spent in each stage of answering a query, in seconds",
+    labels=("stage",),
+)
+BACKEND_QUERY_SECONDS = Histogram(
+    "backend_query_seconds",
+    "Time spent on backend SPARQL queries, including waiting for a slot, in seconds",
+)
+BACKEND_QUERIES = Counter("backend_queries_total", "Backend SPARQL queries run")
+BACKEND_ROWS = Counter("backend_rows_total", "Rows received from the backend")
+BACKEND_BYTES = Counter(
+    "backend_response_bytes_total", "Response bytes received from the backend"
+)
+REPLICA_QUERY_SECONDS = Histogram(
+    "backend_replica_query_seconds",
+    "Time spent on SPARQL queries by each Blazegraph replica, in seconds",
+    labels=("replica",),
+)
+REPLICA_ERRORS = Counter(
+    "backend_replica_errors_total",
+    "Failed SPARQL queries by each Blazegraph replica",
+    labels=("replica",),
+)
+
+
+@contextmanager
+def stage(name):
+    """Time a stage of answering a query, also in its profile if any."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, name)
+        profile = PROFILE.get()
+        if profile is not None:
+            profile.add_stage(name, elapsed)
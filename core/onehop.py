@@ -0,0 +1,284 @@
+"""In-memory index of associations for one-hop queries."""
+import asyncio
+import os
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from core.slot_mapping import get_slot_predicates
+from core.transpile import get_evidence_query
+from core.utilities import PREFIXES, run_query, snake_to_pascal, unprefix
+
+# answer one-hop queries from the in-memory index instead of SPARQL
+ONEHOP_ENGINE = os.environ.get("ONEHOP_ENGINE", "false").lower() == "true"
+
+CLASS_TYPES_QUERY = """
+SELECT DISTINCT ?class ?type
+WHERE {
+    ?instance <http://www.openrdf.org/schema/sesame#directType> ?class .
+    ?instance <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> ?type .
+}
+"""
+ASSOCIATIONS_QUERY = """
+SELECT ?subj_type ?pred ?obj_type (COUNT(*) AS ?count)
+WHERE {
+    {
+        SELECT DISTINCT ?pred
+        WHERE {
+            ?slot <http://translator/text_mining_provider/slot_mapping> ?pred .
+        }
+    }
+    ?subj ?pred ?obj .
+    ?subj <http://www.openrdf.org/schema/sesame#directType> ?subj_type .
+    ?obj <http://www.openrdf.org/schema/sesame#directType> ?obj_type .
+}
+GROUP BY ?subj_type ?pred ?obj_type
+"""
+
+# the loaded index; replaced wholesale by load_onehop()
+ONEHOP = {"index": None}
+
+
+class OneHopIndex:
+    """Associations between classes, as integer-coded sorted arrays.
+
+    Each association is a (subject class, predicate, object class) triple
+    with the number of instance pairs it links and the range of its evidence.
+    Instances of a class are assumed to all have the same rdf:types.
+    """
+
+    def __init__(self, class_types, associations, evidence):
+        """Build the index from SPARQL bindings."""
+        self.terms = []
+        self.codes = {}
+
+        # rdf:type -> sorted codes of the classes whose instances have it
+        classes_by_type = {}
+        for binding in class_types:
+            classes_by_type.setdefault(binding["type"]["value"], set()).add(
+                self.code(binding["class"]["value"])
+            )
+        self.type_classes = {
+            key: numpy.array(sorted(value), dtype=numpy.int32)
+            for key, value in classes_by_type.items()
+        }
+
+        subj = numpy.array(
+            [self.code(row["subj_type"]["value"]) for row in associations],
+            dtype=numpy.int32,
+        )
+        pred = numpy.array(
+            [self.code(row["pred"]["value"]) for row in associations],
+            dtype=numpy.int32,
+        )
+        obj = numpy.array(
+            [self.code(row["obj_type"]["value"]) for row in associations],
+            dtype=numpy.int32,
+        )
+        count = numpy.array(
+            [int(row["count"]["value"]) for row in associations], dtype=numpy.int64
+        )
+        order = numpy.lexsort((obj, pred, subj))
+        self.subj = subj[order]
+        self.pred = pred[order]
+        self.obj = obj[order]
+        self.count = count[order]
+        self.by_obj = numpy.argsort(self.obj, kind="stable")
+        self.obj_sorted = self.obj[self.by_obj]
+
+        # evidence rows, grouped by association in index order
+        position = {
+            (int(subj), int(pred), int(obj)): idx
+            for idx, (subj, pred, obj) in enumerate(zip(self.subj, self.pred, self.obj))
+        }
+        rows = [[] for _ in range(len(self.subj))]
+        for binding in evidence:
+            key = (
+                self.codes.get(binding["subj_type"]["value"], -1),
+                self.codes.get(binding["pred"]["value"], -1),
+                self.codes.get(binding["obj_type"]["value"], -1),
+            )
+            if key in position:
+                rows[position[key]].append(binding)
+        sizes = numpy.array([len(group) for group in rows], dtype=numpy.int64)
+        self.evidence_end = numpy.cumsum(sizes)
+        self.evidence_start = self.evidence_end - sizes
+        self.publications = []
+        self.sentences = []
+        publication_codes = {}
+        sentence_codes = {}
+        publication = []
+        sentence = []
+        score = []
+        self.subject_spans = []
+        self.object_spans = []
+        self.provided_by = []
+        for group in rows:
+            for binding in group:
+                publication.append(
+                    intern_string(
+                        publication_codes,
+                        self.publications,
+                        binding["publications"]["value"],
+                    )
+                )
+                sentence.append(
+                    intern_string(
+                        sentence_codes, self.sentences, binding["sentence"]["value"]
+                    )
+                )
+                score.append(float(binding["score"]["value"]))
+                self.subject_spans.append(binding["subject_spans"]["value"])
+                self.object_spans.append(binding["object_spans"]["value"])
+                self.provided_by.append(sys.intern(binding["provided_by"]["value"]))
+        self.publication = numpy.array(publication, dtype=numpy.int32)
+        self.sentence = numpy.array(sentence, dtype=numpy.int32)
+        self.score = numpy.array(score, dtype=numpy.float64)
+
+    def __len__(self):
+        """Get the number of associations."""
+        return len(self.subj)
+
+    def code(self, iri):
+        """Get the integer code of an IRI, assigning the next one if needed."""
+        code = self.codes.get(iri, None)
+        if code is None:
+            code = self.codes[iri] = len(self.terms)
+            self.terms.append(iri)
+        return code
+
+    def supports(self, qgraph, strict=True):
+        """Check whether the index can answer the query graph."""
+        if not strict or len(qgraph["edges"]) != 1 or len(qgraph["nodes"]) != 2:
+            return False
+        qedge = qgraph["edges"][0]
+        if not isinstance(qedge.get("type", None), str):
+            return False
+        if qedge["source_id"] == qedge["target_id"]:
+            return False
+        return all(node_type(qnode) is not None for qnode in qgraph["nodes"])
+
+    def node_classes(self, qnode):
+        """Get the sorted codes of the classes matching a query node."""
+        return self.type_classes.get(
+            node_type(qnode), numpy.array([], dtype=numpy.int32)
+        )
+
+    def match(self, qgraph):
+        """Get the positions of the associations answering the query graph."""
+        qedge = qgraph["edges"][0]
+        qnodes = {qnode["id"]: qnode for qnode in qgraph["nodes"]}
+        subj_classes = self.node_classes(qnodes[qedge["source_id"]])
+        obj_classes = self.node_classes(qnodes[qedge["target_id"]])
+        preds = numpy.array(
+            sorted(
+                self.codes[predicate]
+                for predicate in get_slot_predicates(PREFIXES["bl"] + qedge["type"])
+                if predicate in self.codes
+            ),
+            dtype=numpy.int32,
+        )
+        # binary search on the more selective end, then mask the rest
+        if len(subj_classes) <= len(obj_classes):
+            positions = search(self.subj, subj_classes)
+            positions = positions[numpy.isin(self.obj[positions], obj_classes)]
+        else:
+            positions = self.by_obj[search(self.obj_sorted, obj_classes)]
+            positions = positions[numpy.isin(self.subj[positions], subj_classes)]
+        positions = positions[numpy.isin(self.pred[positions], preds)]
+        positions.sort()
+        return positions
+
+    def answer(self, qgraph):
+        """Get the response rows and evidence for a supported query graph.
+
+        The rows and evidence are what the SPARQL query and fetch_evidence
+        would give parse_response, but for the blank node instance variables,
+        which parse_response does not use.
+        """
+        qedge = qgraph["edges"][0]
+        rows = []
+        evidence = {}
+        for idx in self.match(qgraph):
+            triple = (
+                self.terms[self.subj[idx]],
+                self.terms[self.pred[idx]],
+                self.terms[self.obj[idx]],
+            )
+            row = {
+                f"{qedge['source_id']}_type": {"type": "uri", "value": triple[0]},
+                qedge["id"]: {"type": "uri", "value": triple[1]},
+                f"{qedge['target_id']}_type": {"type": "uri", "value": triple[2]},
+            }
+            # one row per instance pair, as in the DISTINCT SPARQL solutions
+            rows.extend([row] * int(self.count[idx]))
+            evidence[triple] = [
+                {
+                    "publication": self.publications[self.publication[jdx]],
+                    "score": float(self.score[jdx]),
+                    "sentence": self.sentences[self.sentence[jdx]],
+                    "subject_spans": self.subject_spans[jdx],
+                    "object_spans": self.object_spans[jdx],
+                    "provided_by": self.provided_by[jdx],
+                }
+                for jdx in range(self.evidence_start[idx], self.evidence_end[idx])
+            ]
+        return rows, evidence
+
+
+def intern_string(codes, strings, string):
+    """Get the position of string in strings, appending it if needed."""
+    code = codes.get(string, None)
+    if code is None:
+        code = codes[string] = len(strings)
+        strings.append(string)
+    return code
+
+
+def search(array, values):
+    """Get the positions in the sorted array holding any of the sorted values."""
+    if not len(values):
+        return numpy.array([], dtype=numpy.int64)
+    starts = numpy.searchsorted(array, values, side="left")
+    ends = numpy.searchsorted(array, values, side="right")
+    return numpy.concatenate(
+        [numpy.arange(start, end) for start, end in zip(starts, ends)]
+    )
+
+
+def node_type(qnode):
+    """Get the IRI of the rdf:type that build_query requires of a query node."""
+    if qnode.get("curie", False):
+        if not isinstance(qnode["curie"], str):
+            return None
+        return unprefix(qnode["curie"])
+    if isinstance(qnode.get("type", None), str):
+        return PREFIXES["bl"] + snake_to_pascal(qnode["type"])
+    return None
+
+
+async def load_onehop():
+    """Load the one-hop index from the backend, replacing the current one."""
+    if numpy is None:
+        raise RuntimeError("The one-hop engine requires numpy")
+    class_types, associations, evidence = await asyncio.gather(
+        run_query(CLASS_TYPES_QUERY),
+        run_query(ASSOCIATIONS_QUERY),
+        run_query(get_evidence_query()),
+    )
+    index = await asyncio.get_running_loop().run_in_executor(
+        None, OneHopIndex, class_types, associations, evidence
+    )
+    ONEHOP["index"] = index
+    return index
+
+
+def answer_onehop(qgraph, strict=True):
+    """Get the response rows and evidence from the one-hop index, if it can answer."""
+    index = ONEHOP["index"]
+    if index is None or not index.supports(qgraph, strict):
+        return None
+    return index.answer(qgraph)
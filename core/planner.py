@@ -0,0 +1,136 @@
+"""Order SPARQL triple patterns by selectivity."""
+import asyncio
+from collections import namedtuple
+import os
+
+from core.utilities import PREFIXES, run_query, unprefix
+
+# pin Blazegraph's join order to the planned order
+QUERY_JOIN_HINTS = os.environ.get("QUERY_JOIN_HINTS", "false").lower() == "true"
+JOIN_HINTS_PREFIX = "PREFIX hint: <http://www.bigdata.com/queryHints#>\n"
+JOIN_HINTS = '  hint:Query hint:optimizer "None" .\n'
+
+# instances assumed for a pinned CURIE, which we do not count
+PINNED_CARDINALITY = 1
+
+INSTANCES_QUERY = """
+SELECT (COUNT(?instance) AS ?count)
+WHERE {
+    ?instance <http://www.openrdf.org/schema/sesame#directType> ?type .
+}
+"""
+CLASSES_QUERY = """
+SELECT ?class (COUNT(?instance) AS ?count)
+WHERE {
+    ?instance <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> ?class .
+    FILTER(STRSTARTS(STR(?class), "https://w3id.org/biolink/vocab/"))
+}
+GROUP BY ?class
+"""
+PREDICATES_QUERY = """
+SELECT ?predicate (COUNT(*) AS ?count)
+WHERE {
+    {
+        SELECT DISTINCT ?predicate
+        WHERE {
+            ?slot <http://translator/text_mining_provider/slot_mapping> ?predicate .
+        }
+    }
+    ?subject ?predicate ?object .
+}
+GROUP BY ?predicate
+"""
+
+# cardinalities collected from the store; replaced wholesale by load_statistics()
+STATISTICS = {
+    "instances": 0,
+    "classes": {},
+    "predicates": {},
+}
+
+# a group of lines in a query body, the variables it mentions and the number
+# of solutions it has on its own. VALUES patterns are placed right before the
+# first pattern that uses their variable.
+Pattern = namedtuple(
+    "Pattern", ["text", "variables", "cardinality", "values"], defaults=[False]
+)
+
+
+async def load_statistics():
+    """Collect cardinality statistics from the backend, replacing the current ones."""
+    instances, classes, predicates = await asyncio.gather(
+        run_query(INSTANCES_QUERY),
+        run_query(CLASSES_QUERY),
+        run_query(PREDICATES_QUERY),
+    )
+    statistics = {
+        "instances": sum(int(binding["count"]["value"]) for binding in instances),
+        "classes": {
+            binding["class"]["value"]: int(binding["count"]["value"])
+            for binding in classes
+        },
+        "predicates": {
+            binding["predicate"]["value"]: int(binding["count"]["value"])
+            for binding in predicates
+        },
+    }
+    STATISTICS.update(statistics)
+    return statistics
+
+
+def class_cardinality(curie):
+    """Estimate the number of instances of a class."""
+    iri = unprefix(curie)
+    if iri.startswith(PREFIXES["bl"]):
+        return STATISTICS["classes"].get(iri, 0)
+    return PINNED_CARDINALITY
+
+
+def predicate_cardinality(predicates=None):
+    """Estimate the number of triples with any of the predicates, or any at all."""
+    if predicates is None:
+        return sum(STATISTICS["predicates"].values())
+    return sum(STATISTICS["predicates"].get(predicate, 0) for predicate in predicates)
+
+
+def instance_cardinality():
+    """Estimate the number of instances."""
+    return STATISTICS["instances"]
+
+
+def plan_patterns(patterns):
+    """Order patterns so that the most selective are evaluated first.
+
+    Greedily picks the cheapest pattern that shares a variable with those
+    already placed, falling back to the cheapest of all. A connected pattern
+    costs its average fan-out per instance. Without statistics the patterns
+    are returned as they are. Returns the patterns and whether they were
+    reordered.
+    """
+    instances = STATISTICS["instances"]
+    if not instances:
+        return patterns, False
+
+    values = [pattern for pattern in patterns if pattern.values]
+    remaining = [pattern for pattern in patterns if not pattern.values]
+    ordered = []
+    bound = set()
+
+    def cost(pattern):
+        if pattern.variables & bound:
+            return pattern.cardinality / instances
+        return pattern.cardinality
+
+    while remaining:
+        candidates = [
+            pattern for pattern in remaining if pattern.variables & bound
+        ] or remaining
+        best = min(candidates, key=cost)
+        for pattern in list(values):
+            if pattern.variables & best.variables:
+                ordered.append(pattern)
+                values.remove(pattern)
+        ordered.append(best)
+        remaining.remove(best)
+        bound |= best.variables
+    return ordered + values, True
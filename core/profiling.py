@@ -0,0 +1,78 @@
+"""Per-request profiling."""
+from contextvars import ContextVar
+import time
+
+# the profile of the request being answered, if it asked for one
+PROFILE = ContextVar("profile", default=None)
+# the record of the backend query in progress, in a profiled request
+CALL = ContextVar("call", default=None)
+
+
+class Profile:
+    """Time spent answering one request, by stage and backend query."""
+
+    def __init__(self):
+        """Start profiling."""
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.calls = []
+
+    def add_stage(self, name, seconds):
+        """Record time spent in a stage."""
+        stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+        stage["seconds"] += seconds
+        stage["calls"] += 1
+
+    def add_call(self, priority, streamed=False, coalesced=False):
+        """Record a backend query and return its record, to be filled in."""
+        call = {
+            "priority": priority,
+            "streamed": streamed,
+            "coalesced": coalesced,
+            "seconds": 0.0,
+            "rows": 0,
+            "bytes": 0,
+        }
+        self.calls.append(call)
+        return call
+
+    def dict(self):
+        """Get the breakdown."""
+        calls = [call for call in self.calls if not call["coalesced"]]
+        parse_seconds = self.stages.get("parse_response", {}).get("seconds", 0.0)
+        # parse_response consumes the streamed main query and waits for the
+        # evidence queries
+        waiting = sum(call["seconds"] for call in calls if call["streamed"])
+        waiting += self.stages.get("evidence_query", {}).get("seconds", 0.0)
+        return {
+            "seconds": time.perf_counter() - self.start,
+            "stages": self.stages,
+            "backend": {
+                "queries": len(calls),
+                "coalesced": len(self.calls) - len(calls),
+                "seconds": sum(call["seconds"] for call in calls),
+                "rows": sum(call["rows"] for call in calls),
+                "bytes": sum(call["bytes"] for call in calls),
+                "calls": self.calls,
+            },
+            "parse_response": {
+                "seconds": parse_seconds,
+                "backend_seconds": waiting,
+                "parse_seconds": parse_seconds - waiting,
+            },
+        }
+
+
+def start_call(priority, streamed=False, coalesced=False):
+    """Record a backend query if profiling, returning its record or None."""
+    profile = PROFILE.get()
+    if profile is None:
+        return None
+    return profile.add_call(priority, streamed=streamed, coalesced=coalesced)
+
+
+def add_bytes(size):
+    """Count response bytes towards the backend query in progress."""
+    call = CALL.get()
+    if call is not None:
+        call["bytes"] += size
@@ -0,0 +1,162 @@
+"""SPARQL results in the TSV and CSV formats.
+
+Rows are parsed into the same bindings as the SPARQL JSON results:
+variable -> {"type", "value"} and "xml:lang" or "datatype" for literals,
+with unbound variables left out.
+"""
+import codecs
+import csv
+import re
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+# Turtle escapes, as used in TSV literals
+ESCAPE = re.compile(r"\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))")
+ESCAPES = {
+    "t": "\t",
+    "b": "\b",
+    "n": "\n",
+    "r": "\r",
+    "f": "\f",
+    '"': '"',
+    "'": "'",
+    "\\": "\\",
+}
+# looks like an absolute IRI, e.g. http://... or urn:...
+IRI = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*:")
+
+
+def unescape(match):
+    """Get the character for a Turtle escape sequence."""
+    code = match.group(1) or match.group(2)
+    if code is not None:
+        return chr(int(code, 16))
+    return ESCAPES.get(match.group(3), match.group(0))
+
+
+def tsv_term(cell):
+    """Get the binding of an RDF term in TSV (Turtle) syntax."""
+    first = cell[0]
+    if first == "<":
+        return {"type": "uri", "value": cell[1:-1]}
+    if first == '"':
+        end = cell.rindex('"')
+        value = cell[1:end]
+        if "\\" in value:
+            value = ESCAPE.sub(unescape, value)
+        binding = {"type": "literal", "value": value}
+        suffix = cell[end + 1 :]
+        if suffix.startswith("@"):
+            binding["xml:lang"] = suffix[1:]
+        elif suffix.startswith("^^"):
+            binding["datatype"] = suffix[3:-1]
+        return binding
+    if cell.startswith("_:"):
+        return {"type": "bnode", "value": cell[2:]}
+    # bare numbers and booleans
+    if cell in ("true", "false"):
+        datatype = "boolean"
+    elif "e" in cell or "E" in cell:
+        datatype = "double"
+    elif "." in cell:
+        datatype = "decimal"
+    else:
+        datatype = "integer"
+    return {"type": "literal", "value": cell, "datatype": XSD + datatype}
+
+
+def tsv_variables(line):
+    """Get the variable names from a TSV header line."""
+    return [name[1:] for name in line.rstrip("\r").split("\t")]
+
+
+def tsv_binding(line, variables, iris):
+    """Parse a TSV row into a binding.
+
+    iris caches the bindings of the IRIs seen so far, as results repeat them
+    a lot; the bindings are shared and must not be modified.
+    """
+    binding = {}
+    for variable, cell in zip(variables, line.rstrip("\r").split("\t")):
+        if not cell:
+            continue
+        if cell[0] == "<":
+            term = iris.get(cell, None)
+            if term is None:
+                term = iris[cell] = {"type": "uri", "value": cell[1:-1]}
+            binding[variable] = term
+        else:
+            binding[variable] = tsv_term(cell)
+    return binding
+
+
+def csv_term(value):
+    """Get the binding of a CSV value.
+
+    CSV results do not tell IRIs from literals, so values that look like
+    absolute IRIs are taken as IRIs and literals lose their language and
+    datatype.
+    """
+    if value.startswith("_:"):
+        return {"type": "bnode", "value": value[2:]}
+    if IRI.match(value) and " " not in value:
+        return {"type": "uri", "value": value}
+    return {"type": "literal", "value": value}
+
+
+def csv_binding(record, variables):
+    """Parse a CSV record into a binding."""
+    return {
+        variable: csv_term(value)
+        for variable, value in zip(variables, next(csv.reader([record])))
+        if value
+    }
+
+
+async def iter_lines(chunks):
+    """Decode chunks of bytes into lines, without the line feeds."""
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += utf8.decode(chunk)
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield line
+    buffer += utf8.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+async def iter_tsv_bindings(chunks):
+    """Incrementally parse a TSV results body, yielding each row's binding."""
+    variables = None
+    iris = {}
+    async for line in iter_lines(chunks):
+        if variables is None:
+            variables = tsv_variables(line)
+        elif line:
+            yield tsv_binding(line, variables, iris)
+
+
+async def iter_csv_records(lines):
+    """Join lines into CSV records, as quoted values may span lines."""
+    pending = ""
+    async for line in lines:
+        pending += line
+        # a record is complete when its quotes are balanced
+        if pending.count('"') % 2:
+            pending += "\n"
+            continue
+        if pending.strip("\r"):
+            yield pending
+        pending = ""
+
+
+async def iter_csv_bindings(chunks):
+    """Incrementally parse a CSV results body, yielding each row's binding."""
+    variables = None
+    async for record in iter_csv_records(iter_lines(chunks)):
+        if variables is None:
+            variables = next(csv.reader([record]))
+        else:
+            yield csv_binding(record, variables)
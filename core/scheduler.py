@@ -0,0 +1,108 @@
+"""Backend query scheduling."""
+import asyncio
+from contextlib import asynccontextmanager
+import heapq
+import itertools
+import os
+
+BACKEND_MAX_IN_FLIGHT = int(os.environ.get("BACKEND_MAX_IN_FLIGHT", 16))
+BACKEND_MAX_QUEUED = int(os.environ.get("BACKEND_MAX_QUEUED", 256))
+BACKEND_RETRY_AFTER = int(os.environ.get("BACKEND_RETRY_AFTER", 5))
+
+# lower values are scheduled first
+PRIORITY_MAIN = 0
+PRIORITY_EVIDENCE = 1
+PRIORITY_DETAIL = 1
+PRIORITY_BACKGROUND = 2
+
+
+class Overloaded(Exception):
+    """The backend wait queue is full."""
+
+
+class QueryScheduler:
+    """Limit the number of backend queries in flight.
+
+    Queries beyond the limit wait in a priority queue. Lower priority values
+    go first, and equal priorities go first-come, first-served.
+
+    admit() is the only check of max_queued: new requests are turned away
+    once that many queries wait, but the evidence, detail and background
+    queries of work already under way always queue, and may take the queue
+    past it.
+    """
+
+    def __init__(self, max_in_flight, max_queued):
+        """Initialize an idle scheduler."""
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.in_flight = 0
+        self.waiters = []
+        self.counter = itertools.count()
+
+    def admit(self):
+        """Raise Overloaded if the wait queue is full.
+
+        Called before starting new work, so that work already admitted can
+        still queue its follow-up queries.
+        """
+        if len(self.waiters) >= self.max_queued:
+            raise Overloaded(
+                f"{len(self.waiters)} backend queries are already waiting"
+            )
+
+    async def acquire(self, priority):
+        """Wait for a slot, however many queries are waiting already."""
+        if self.in_flight < self.max_in_flight and not self.waiters:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self.counter), future)
+        heapq.heappush(self.waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if entry in self.waiters:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+            elif not future.cancelled():
+                # the slot was handed over as we were cancelled, pass it on
+                self.release()
+            raise
+
+    def release(self):
+        """Hand the slot to the next waiter, or free it."""
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority, timeout=None):
+        """Hold a slot for the duration of the block.
+
+        Raises asyncio.TimeoutError if no slot is free within timeout seconds.
+        """
+        if timeout is None:
+            await self.acquire(priority)
+        else:
+            await asyncio.wait_for(self.acquire(priority), timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """Get the number of queries in flight and waiting."""
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self.waiters),
+        }
+
+
+SCHEDULER = QueryScheduler(
+    max_in_flight=BACKEND_MAX_IN_FLIGHT,
+    max_queued=BACKEND_MAX_QUEUED,
+)
@@ -0,0 +1,65 @@
+"""Biolink slot to predicate mapping."""
+from collections import defaultdict
+
+from core.utilities import run_query
+
+SLOT_MAPPING_QUERY = """
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+SELECT DISTINCT ?slot ?predicate ?label
+WHERE {
+    ?slot <http://translator/text_mining_provider/slot_mapping> ?predicate .
+    OPTIONAL { ?predicate rdfs:label ?label . }
+}
+"""
+
+# biolink slot IRI -> predicate IRIs, predicate IRI -> biolink slot IRIs, and
+# predicate IRI -> label; replaced wholesale by load_slot_mapping()
+SLOT_MAPPING = {
+    "predicates": {},
+    "slots": {},
+    "labels": {},
+}
+
+
+def index_slot_mapping(bindings):
+    """Build the bidirectional slot mapping from SPARQL bindings."""
+    predicates = defaultdict(list)
+    slots = defaultdict(list)
+    labels = {}
+    for binding in bindings:
+        slot = binding["slot"]["value"]
+        predicate = binding["predicate"]["value"]
+        if predicate not in predicates[slot]:
+            predicates[slot].append(predicate)
+        if slot not in slots[predicate]:
+            slots[predicate].append(slot)
+        if "label" in binding:
+            labels[predicate] = binding["label"]["value"]
+    return {
+        "predicates": dict(predicates),
+        "slots": dict(slots),
+        "labels": labels,
+    }
+
+
+async def load_slot_mapping():
+    """Load the slot mapping from the backend, replacing the current one."""
+    bindings = await run_query(SLOT_MAPPING_QUERY)
+    mapping = index_slot_mapping(bindings)
+    SLOT_MAPPING.update(mapping)
+    return mapping
+
+
+def get_slot_predicates(slot):
+    """Get the predicate IRIs mapped to a biolink slot IRI."""
+    return SLOT_MAPPING["predicates"].get(slot, [])
+
+
+def get_predicate_slots(predicate):
+    """Get the biolink slot IRIs mapped to a predicate IRI."""
+    return SLOT_MAPPING["slots"].get(predicate, [])
+
+
+def get_predicate_label(predicate):
+    """Get the label of a predicate IRI, if any."""
+    return SLOT_MAPPING["labels"].get(predicate, None)
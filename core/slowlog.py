@@ -0,0 +1,111 @@
+"""Slow backend query log."""
+import asyncio
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import os
+
+from core.backends import BACKEND
+from core.scheduler import SCHEDULER, PRIORITY_BACKGROUND
+
+# JSON lines file of backend queries taking at least SLOW_QUERY_SECONDS;
+# no log if empty
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG", "")
+SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_SECONDS", 10))
+SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get("SLOW_QUERY_LOG_MAX_BYTES", 2**24))
+SLOW_QUERY_LOG_BACKUPS = int(os.environ.get("SLOW_QUERY_LOG_BACKUPS", 5))
+# re-run slow queries to log the backend's query plan
+SLOW_QUERY_EXPLAIN = os.environ.get("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+# explain re-runs at once, beyond which slow queries are logged without a plan
+SLOW_QUERY_EXPLAIN_MAX = int(os.environ.get("SLOW_QUERY_EXPLAIN_MAX", 2))
+# seconds an explain re-run may take, including waiting for a slot
+SLOW_QUERY_EXPLAIN_TIMEOUT = float(os.environ.get("SLOW_QUERY_EXPLAIN_TIMEOUT", 60))
+
+# the query graph(s) being answered, for the log records
+QGRAPH = ContextVar("qgraph", default=None)
+
+LOGGER = logging.getLogger(__name__)
+SLOW_QUERY_LOGGER = logging.getLogger("slow_queries")
+SLOW_QUERY_LOGGER.propagate = False
+SLOW_QUERY_LOGGER.setLevel(logging.INFO)
+
+# the open log file handler; replaced by open_slow_query_log()
+HANDLER = {"handler": None}
+# explain tasks in progress, referenced until they are done
+EXPLAINING = set()
+
+
+def open_slow_query_log(path=SLOW_QUERY_LOG):
+    """Write the slow query log to path, with rotation."""
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=SLOW_QUERY_LOG_MAX_BYTES,
+        backupCount=SLOW_QUERY_LOG_BACKUPS,
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    close_slow_query_log()
+    SLOW_QUERY_LOGGER.addHandler(handler)
+    HANDLER["handler"] = handler
+
+
+def close_slow_query_log():
+    """Stop writing the slow query log."""
+    handler = HANDLER["handler"]
+    if handler is not None:
+        SLOW_QUERY_LOGGER.removeHandler(handler)
+        handler.close()
+        HANDLER["handler"] = None
+
+
+def record_query(query, seconds, rows, status="ok"):
+    """Log the backend query if it was slow.
+
+    status is "ok", "failed" or "cancelled", e.g. at the deadline.
+    """
+    if seconds < SLOW_QUERY_SECONDS or HANDLER["handler"] is None:
+        return
+    record = {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "seconds": seconds,
+        "rows": rows,
+        "status": status,
+        "query": query,
+        "query_graph": QGRAPH.get(),
+    }
+    if not SLOW_QUERY_EXPLAIN:
+        write_record(record)
+        return
+    if len(EXPLAINING) >= SLOW_QUERY_EXPLAIN_MAX:
+        record["explain_error"] = "Too many slow queries being explained"
+        write_record(record)
+        return
+    task = asyncio.ensure_future(explain(record))
+    EXPLAINING.add(task)
+    task.add_done_callback(EXPLAINING.discard)
+
+
+async def explain(record):
+    """Log the record with the backend's plan for its query."""
+    try:
+        record["explain"] = await asyncio.wait_for(
+            explain_query(record["query"]), SLOW_QUERY_EXPLAIN_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        record["explain_error"] = "Timed out"
+    except Exception as err:
+        LOGGER.exception("Failed to explain a slow query")
+        record["explain_error"] = str(err) or type(err).__name__
+    write_record(record)
+
+
+async def explain_query(query):
+    """Get the backend's plan for query, behind all other backend queries."""
+    async with SCHEDULER.slot(PRIORITY_BACKGROUND):
+        return await BACKEND.explain(query)
+
+
+def write_record(record):
+    """Write a record to the slow query log."""
+    SLOW_QUERY_LOGGER.info(json.dumps(record))
@@ -1,7 +1,8 @@
 """Build a SPARQL Query."""
+import asyncio
 from collections import defaultdict
-
-import httpx
+from functools import lru_cache
+import sys
 
 from core.utilities import (
     PREFIXES,
@@ -10,17 +11,91 @@ from core.utilities import (
     apply_prefix,
     hash_dict,
     unprefix,
+    unprefix_all,
     run_query,
+    aiterate,
+)
+from core.deadlines import or_truncated
+from core.metrics import stage
+from core.planner import (
+    JOIN_HINTS,
+    JOIN_HINTS_PREFIX,
+    QUERY_JOIN_HINTS,
+    Pattern,
+    class_cardinality,
+    instance_cardinality,
+    plan_patterns,
+    predicate_cardinality,
+)
+from core.scheduler import PRIORITY_EVIDENCE
+from core.slot_mapping import (
+    get_slot_predicates,
+    get_predicate_slots,
+    get_predicate_label,
 )
 
+# maximum number of (source type, predicate, target type) triples per evidence query
+EVIDENCE_BATCH_SIZE = 500
 
-async def build_query(qgraph, strict=True, limit=-1):
-    """Build a SPARQL Query string."""
-    query = ""
+
+def split_curies(qgraph):
+    """Split a query graph into its shape and its pinned node CURIEs.
+
+    Query graphs with the same shape differ only in their CURIEs, so they can
+    be answered together by passing all their CURIEs to build_query.
+    """
+    shape = {
+        "nodes": [
+            {**node, "curie": True} if node.get("curie", False) else node
+            for node in qgraph["nodes"]
+        ],
+        "edges": qgraph["edges"],
+    }
+    curies = {
+        node["id"]: node["curie"]
+        for node in qgraph["nodes"]
+        if node.get("curie", False)
+    }
+    return shape, curies
+
+
+async def build_query(qgraph, strict=True, limit=-1, offset=None, curies=None):
+    """Build a SPARQL Query string.
+
+    If offset is given, the solutions are put in a total order and the
+    query returns the page starting at offset.
+
+    If curies is given, it is a list of {node id: CURIE} dicts as returned by
+    split_curies, and the query answers the qgraph for each of them. The
+    pinned nodes' CURIEs are then projected as ?<node id>_curie.
+    """
+    patterns = []
     node_types = {}
+    curie_ids = list(curies[0]) if curies else []
+    if curie_ids:
+        rows = " ".join(
+            sorted(
+                {
+                    "( " + " ".join(binding[node_id] for node_id in curie_ids) + " )"
+                    for binding in curies
+                }
+            )
+        )
+        curie_vars = " ".join(f"?{node_id}_curie" for node_id in curie_ids)
+        patterns.append(
+            Pattern(
+                f"VALUES ({curie_vars}) {{ {rows} }}\n",
+                {f"{node_id}_curie" for node_id in curie_ids},
+                len(curies),
+                values=True,
+            )
+        )
     for node in qgraph["nodes"]:
 
-        if node.get("curie", False):
+        if node["id"] in curie_ids:
+            # enforce one of the batch's node curies
+            node_types[node["id"]] = f"?{node['id']}_curie"
+        elif node.get("curie", False):
             # enforce node curie
             node_types[node["id"]] = node["curie"]
         elif node["type"]:
@@ -28,46 +103,67 @@ async def build_query(qgraph, strict=True, limit=-1):
             pascal_node_type = snake_to_pascal(node["type"])
             node_types[node["id"]] = f"bl:{pascal_node_type}"
         if strict:
-            query += f"  ?{node['id']} sesame:directType ?{node['id']}_type .\n"
+            patterns.append(
+                Pattern(
+                    f"  ?{node['id']} sesame:directType ?{node['id']}_type .\n",
+                    {node["id"], f"{node['id']}_type"},
+                    instance_cardinality(),
+                )
+            )
 
     instance_vars = set()
     instance_vars_to_types = {}
     for idx, edge in enumerate(qgraph["edges"]):
         var = edge["id"]
+        edge_predicates = None
         if edge["type"]:
             # enforce edge type
-            predicate_query = f"""
-            PREFIX bl: <https://w3id.org/biolink/vocab/>
-            SELECT DISTINCT ?predicate
-            WHERE {{
-                bl:{edge['type']} <http://translator/text_mining_provider/slot_mapping> ?predicate .
-            }}
-            """
-            bindings = await run_query(predicate_query)
-            predicates = " ".join(
-                [f"<{binding['predicate']['value']}>" for binding in bindings]
-            )
+            edge_predicates = get_slot_predicates(PREFIXES["bl"] + edge["type"])
+            predicates = " ".join([f"<{predicate}>" for predicate in edge_predicates])
 
             # predicates = edge["type"]
-            query += f"VALUES ?{var} {{ {predicates} }}\n"
+            patterns.append(
+                Pattern(
+                    f"VALUES ?{var} {{ {predicates} }}\n",
+                    {var},
+                    len(edge_predicates),
+                    values=True,
+                )
+            )
+        edge_cardinality = predicate_cardinality(edge_predicates)
 
         # enforce connectivity
         if strict:
-            query += f"  ?{edge['source_id']} ?{var} ?{edge['target_id']} .\n"
+            patterns.append(
+                Pattern(
+                    f"  ?{edge['source_id']} ?{var} ?{edge['target_id']} .\n",
+                    {edge["source_id"], var, edge["target_id"]},
+                    edge_cardinality,
+                )
+            )
             instance_vars.add(edge["source_id"])
             instance_vars_to_types[edge["source_id"]] = edge["source_id"]
             instance_vars.add(edge["target_id"])
             instance_vars_to_types[edge["target_id"]] = edge["target_id"]
         else:
             exclude_list = "<http://purl.obolibrary.org/obo/GO_0003674>, <http://purl.obolibrary.org/obo/GO_0008150>, <http://purl.obolibrary.org/obo/GO_0005575>"
-            query += f"  ?{edge['source_id']}_{idx} sesame:directType ?{edge['source_id']}_type .\n"
-            query += f"FILTER(?{edge['source_id']}_type NOT IN ({exclude_list}))\n"
-            query += f"FILTER NOT EXISTS {{ ?{edge['source_id']}_type rdfs:isDefinedBy <http://purl.obolibrary.org/obo/bfo.owl> }}\n"
-            query += f"  ?{edge['target_id']}_{idx} sesame:directType ?{edge['target_id']}_type .\n"
-            query += f"FILTER(?{edge['target_id']}_type NOT IN ({exclude_list}))\n"
-            query += f"FILTER NOT EXISTS {{ ?{edge['target_id']}_type rdfs:isDefinedBy <http://purl.obolibrary.org/obo/bfo.owl> }}\n"
-            query += (
-                f"  ?{edge['source_id']}_{idx} ?{var} ?{edge['target_id']}_{idx} .\n"
+            for node_id in (edge["source_id"], edge["target_id"]):
+                text = f"  ?{node_id}_{idx} sesame:directType ?{node_id}_type .\n"
+                text += f"FILTER(?{node_id}_type NOT IN ({exclude_list}))\n"
+                text += f"FILTER NOT EXISTS {{ ?{node_id}_type rdfs:isDefinedBy <http://purl.obolibrary.org/obo/bfo.owl> }}\n"
+                patterns.append(
+                    Pattern(
+                        text,
+                        {f"{node_id}_{idx}", f"{node_id}_type"},
+                        instance_cardinality(),
+                    )
+                )
+            patterns.append(
+                Pattern(
+                    f"  ?{edge['source_id']}_{idx} ?{var} ?{edge['target_id']}_{idx} .\n",
+                    {f"{edge['source_id']}_{idx}", var, f"{edge['target_id']}_{idx}"},
+                    edge_cardinality,
+                )
             )
             instance_vars.add(f"{edge['source_id']}_{idx}")
             instance_vars_to_types[f"{edge['source_id']}_{idx}"] = edge["source_id"]
@@ -75,21 +171,47 @@ async def build_query(qgraph, strict=True, limit=-1):
             instance_vars_to_types[f"{edge['target_id']}_{idx}"] = edge["target_id"]
     for var, var_to_type in instance_vars_to_types.items():
         var_type = node_types[var_to_type]
-        query += f"?{var} rdf:type {var_type} .\n"
+        if var_to_type in curie_ids:
+            patterns.append(
+                Pattern(
+                    f"?{var} rdf:type {var_type} .\n",
+                    {var, f"{var_to_type}_curie"},
+                    len(curies),
+                )
+            )
+        else:
+            patterns.append(
+                Pattern(
+                    f"?{var} rdf:type {var_type} .\n",
+                    {var},
+                    class_cardinality(var_type),
+                )
+            )
 
-    query += "}"
-    if limit >= 0:
-        query += f" LIMIT {limit}"
+    patterns, planned = plan_patterns(patterns)
+    hints = planned and QUERY_JOIN_HINTS
+    query = JOIN_HINTS if hints else ""
+    query += "".join(pattern.text for pattern in patterns)
 
     prequel = ""
     for key, value in PREFIXES.items():
         prequel += f"PREFIX {key}: <{value}>\n"
+    if hints:
+        prequel += JOIN_HINTS_PREFIX
     ids = [f"?{var}" for var in instance_vars]
     ids += [f"?{node['id']}_type" for node in qgraph["nodes"]]
     ids += list({f"?{edge['id']}" for edge in qgraph["edges"]})
+    ids += [f"?{node_id}_curie" for node_id in curie_ids]
     ids.sort()  # sorting to ensure reproducible order in unit tests
     var_string = " ".join(ids)
     prequel += f"\nSELECT DISTINCT {var_string} WHERE {{\n"
+
+    query += "}"
+    if offset is not None:
+        # order by every projected variable so that consecutive pages agree
+        query += f" ORDER BY {var_string} OFFSET {offset}"
+    if limit >= 0:
+        query += f" LIMIT {limit}"
     return prequel + query
 
 
@@ -106,166 +228,215 @@ def get_details(kgraph):
     for key, value in PREFIXES.items():
         query += f"PREFIX {key}: <{value}>\n"
     query += f"\nSELECT DISTINCT ?kid ?blclass ?label WHERE {{\n"
-    values = " ".join([f"<{unprefix(kid)}>" for qid, kid in node_map.items()])
+    values = " ".join([f"<{iri}>" for iri in unprefix_all(node_map.values())])
     query += f"VALUES ?kid {{ {values} }}\n"
     query += "?kid rdfs:subClassOf ?blclass .\n"
     # query += "?blclass blml:is_a* bl:NamedThing .\n"
     query += "OPTIONAL { ?kid rdfs:label ?label . }"
     query += "}"
 
-    slot_query = ""
-    for key, value in PREFIXES.items():
-        slot_query += f"PREFIX {key}: <{value}>\n"
-    slot_query += f"\nSELECT DISTINCT ?qid ?kid ?blslot ?label WHERE {{\n"
-    values = " ".join(
-        [f'( <{unprefix(kid)}> "{qid}" )' for qid, kid in edge_map2.items()]
-    )
-    slot_query += f"VALUES (?kid ?qid) {{ {values} }}\n"
-    slot_query += (
-        "?blslot <http://translator/text_mining_provider/slot_mapping> ?kid .\n"
-    )
-    # slot_query += """FILTER NOT EXISTS {
-    #     ?other <http://translator/text_mining_provider/slot_mapping> ?kid .
-    #     ?other blml:is_a+/blml:mixins* ?blslot .
-    # }"""
-    slot_query += "OPTIONAL { ?kid rdfs:label ?label . }\n"
-    slot_query += "}"
+    # the slot mapping is held in memory, so look the slots up locally
+    slot_response = []
+    for qid, kid in edge_map2.items():
+        predicate = unprefix(kid)
+        label = get_predicate_label(predicate)
+        for slot in get_predicate_slots(predicate):
+            row = {
+                "qid": {"value": qid},
+                "kid": {"value": predicate},
+                "blslot": {"value": slot},
+            }
+            if label is not None:
+                row["label"] = {"value": label}
+            slot_response.append(row)
 
     return (
         query,
-        slot_query,
+        slot_response,
         node_map,
         {key: edge_map[value] for key, value in edge_map2.items()},
     )
 
 
-async def parse_response(response, qgraph, strict=True):
-    """Parse the query response."""
+class KNode:
+    """Knowledge graph node, while the response is parsed."""
+
+    __slots__ = ("id",)
+
+    def __init__(self, id):
+        """Initialize node."""
+        self.id = id
+
+    def dict(self):
+        """Get the knowledge graph node."""
+        return {"id": self.id}
+
+
+class KEdge:
+    """Knowledge graph edge, while the response is parsed."""
+
+    __slots__ = ("id", "type", "source_id", "target_id")
+
+    def __init__(self, id, type, source_id, target_id):
+        """Initialize edge."""
+        self.id = id
+        self.type = type
+        self.source_id = source_id
+        self.target_id = target_id
+
+    def dict(self):
+        """Get the knowledge graph edge."""
+        return {
+            "id": self.id,
+            "type": self.type,
+            "source_id": self.source_id,
+            "target_id": self.target_id,
+        }
+
+
+@lru_cache(maxsize=2**16)
+def get_edge_id(edge_type, source_id, target_id):
+    """Get the id of a knowledge graph edge, a hash of its contents."""
+    return hash_dict(
+        {
+            "type": edge_type,
+            "source_id": source_id,
+            "target_id": target_id,
+        }
+    )
+
+
+async def parse_response(response, qgraph, strict=True, evidence=None):
+    """Parse the query response.
+
+    response is a list of bindings or an async iterator of them, e.g. from
+    stream_query, in which case rows are parsed as they arrive.
+
+    Returns the knowledge graph, the results and the provenance table whose
+    publications and sentences the edge binding evidence refers to by index.
+    Results share their node and edge binding dicts, so treat them as
+    read-only.
+
+    evidence is the output of fetch_evidence for (at least) the edges in
+    the response, if it has already been fetched.
+    """
     results = []
-    kgraph = {
-        "nodes": dict(),
-        "edges": dict(),
-    }
-    edge_idx = 0
-    for row in response:
+    # distinct nodes and edges, and the bindings to them that results share
+    nodes = dict()
+    edges = dict()
+    node_bindings = dict()
+    edge_bindings = dict()
+    # edge bindings awaiting evidence, keyed by (source type, predicate, target type)
+    pending = defaultdict(list)
+    async for row in aiterate(response):
         result = {"node_bindings": [], "edge_bindings": []}
         # handle nodes
         node_ids = dict()
         for qnode in qgraph["nodes"]:
-            node_id = apply_prefix(row[f"{qnode['id']}_type"]["value"])
-            node_ids[qnode["id"]] = node_id
-            kgraph["nodes"][node_id] = {
-                "id": node_id,
-            }
-            result["node_bindings"].append(
-                {
+            key = (qnode["id"], row[f"{qnode['id']}_type"]["value"])
+            node_binding = node_bindings.get(key, None)
+            if node_binding is None:
+                node_id = sys.intern(apply_prefix(key[1]))
+                if node_id not in nodes:
+                    nodes[node_id] = KNode(node_id)
+                node_binding = node_bindings[key] = {
                     "qg_id": qnode["id"],
                     "kg_id": node_id,
                 }
-            )
+            node_ids[qnode["id"]] = node_binding["kg_id"]
+            result["node_bindings"].append(node_binding)
         # handle edges
         for idx, qedge in enumerate(qgraph["edges"]):
-            var = qedge["id"]
-            edge_type = apply_prefix(row[f"{var}"]["value"])
-            source_id = node_ids[qedge["source_id"]]
-            target_id = node_ids[qedge["target_id"]]
-            edge = {
-                "type": edge_type,
-                "source_id": source_id,
-                "target_id": target_id,
-            }
-            edge_id = hash_dict(edge)
-            kgraph["edges"][edge_id] = {
-                "id": edge_id,
-                **edge,
-            }
-
             # if strict:
             #     src = row[qedge["source_id"]]["value"]
             #     obj = row[qedge["target_id"]]["value"]
             # else:
             #     src = row[f"{qedge['source_id']}_{idx}"]["value"]
             #     obj = row[f"{qedge['target_id']}_{idx}"]["value"]
-            pred = row[qedge["id"]]["value"]
-            query = get_evidence_query(source_id, pred, target_id)
-
-            bindings = await run_query(query)
-
-            # for each evidence add score, sentence, etc.
-            provenance = []
-            for idx, binding in enumerate(bindings):
-
-                pmid = binding["publications"]["value"]
-                score = binding["score"]["value"]
-                sentence = binding["sentence"]["value"]
-                subject_spans = binding["subject_spans"]["value"]
-                object_spans = binding["object_spans"]["value"]
-                provided_by = binding["provided_by"]["value"]
-
-                prov = {
-                    "publication": pmid,
-                    "score": score,
-                    "sentence": sentence,
-                    "subject_spans": subject_spans,
-                    "object_spans": object_spans,
-                    "provided_by": provided_by,
-                }
-
-                provenance.append(prov)
-
-            result["edge_bindings"].append(
-                {
+            evidence_key = (
+                row[f"{qedge['source_id']}_type"]["value"],
+                row[qedge["id"]]["value"],
+                row[f"{qedge['target_id']}_type"]["value"],
+            )
+            key = (qedge["id"], evidence_key)
+            edge_binding = edge_bindings.get(key, None)
+            if edge_binding is None:
+                source_id = node_ids[qedge["source_id"]]
+                target_id = node_ids[qedge["target_id"]]
+                edge_key = (evidence_key[1], source_id, target_id)
+                edge = edges.get(edge_key, None)
+                if edge is None:
+                    edge_type = sys.intern(apply_prefix(evidence_key[1]))
+                    edge = edges[edge_key] = KEdge(
+                        get_edge_id(edge_type, source_id, target_id),
+                        edge_type,
+                        source_id,
+                        target_id,
+                    )
+                edge_binding = edge_bindings[key] = {
                     "qg_id": qedge["id"],
-                    "kg_id": edge_id,
-                    "provenance": str(provenance),
+                    "kg_id": edge.id,
                 }
-            )
-
-            # NOTE: assigning separate fields did not work. Always ended up with an empty 'provenance' variable -- which is defined in models.EdgeBinding
-            # # for each evidence add score, sentence, etc.
-            # for idx, binding in enumerate(bindings):
-            #     print("================APPENDING BINDING" + str(binding))
-            #     result["edge_bindings"][0][f"publication_{idx}"] = binding[
-            #         "publications"
-            #     ]["value"]
-            #     result["edge_bindings"][0][f"score_{idx}"] = binding["score"]["value"]
-            #     result["edge_bindings"][0][f"sentence_{idx}"] = binding["sentence"][
-            #         "value"
-            #     ]
-            #     result["edge_bindings"][0][f"subject_spans_{idx}"] = binding[
-            #         "subject_spans"
-            #     ]["value"]
-            #     result["edge_bindings"][0][f"object_spans_{idx}"] = binding[
-            #         "object_spans"
-            #     ]["value"]
-            #     result["edge_bindings"][0][f"provided_by_{idx}"] = binding[
-            #         "provided_by"
-            #     ]["value"]
-            #     print(
-            #         "=================APPENDED EDGE BINDINGS:\n"
-            #         + str(result["edge_bindings"])
-            #     )
-
-            edge_idx += 1
+                pending[evidence_key].append(edge_binding)
+            result["edge_bindings"].append(edge_binding)
         results.append(result)
 
-    return kgraph, results
+    kgraph = {
+        "nodes": {node.id: node.dict() for node in nodes.values()},
+        "edges": {edge.id: edge.dict() for edge in edges.values()},
+    }
+
+    # fetch the evidence for all distinct edges at once and fan it back out,
+    # with publications and sentences stored once and referenced by index
+    if evidence is None:
+        evidence = await fetch_evidence(pending.keys())
+    publications = dict()
+    sentences = dict()
+    for key, edge_bindings in pending.items():
+        provenance = [
+            {
+                **prov,
+                "publication": publications.setdefault(
+                    prov["publication"], len(publications)
+                ),
+                "sentence": sentences.setdefault(prov["sentence"], len(sentences)),
+            }
+            for prov in evidence.get(key, [])
+        ]
+        for edge_binding in edge_bindings:
+            edge_binding["provenance"] = provenance
+
+    return (
+        kgraph,
+        results,
+        {
+            "publications": list(publications),
+            "sentences": list(sentences),
+        },
+    )
 
 
 def parse_kgraph(response, slot_response, node_map, edge_map, kgraph):
     """Parse the query response."""
+    # index the detail rows by node and the slot rows by edge type, once
+    response_by_kid = defaultdict(list)
+    for row in response:
+        response_by_kid[row["kid"]["value"]].append(row)
+    slot_response_by_qid = defaultdict(list)
+    for row in slot_response:
+        slot_response_by_qid[row["qid"]["value"]].append(row)
+
     nodes = kgraph["nodes"]
-    for qid, kid in node_map.items():
+    kids = list(node_map.values())
+    for kid, fullkid in zip(kids, unprefix_all(kids)):
         nodes[kid]["type"] = set()
-        for row in response:
-            fullkid = unprefix(kid)
-            if row["kid"]["value"] == fullkid:
-                if "label" in row:
-                    nodes[kid]["name"] = row["label"]["value"]
-                node_type = pascal_to_snake(
-                    apply_prefix(row["blclass"]["value"]).split(":", 1)[1]
-                )
-                nodes[kid]["type"].add(node_type)
+        for row in response_by_kid.get(fullkid, []):
+            if "label" in row:
+                nodes[kid]["name"] = row["label"]["value"]
+            node_type = pascal_to_snake(
+                apply_prefix(row["blclass"]["value"]).split(":", 1)[1]
+            )
+            nodes[kid]["type"].add(node_type)
         # reasoner validator seems to want a list instead of set for the node type
         # sorted to ensure reproducibility for unit tests
         nodes[kid]["type"] = list(nodes[kid]["type"])
@@ -274,29 +445,52 @@ def parse_kgraph(response, slot_response, node_map, edge_map, kgraph):
 
     edges = kgraph["edges"]
     for qid, kids in edge_map.items():
-        for row in slot_response:
-            if row["qid"]["value"] == qid:
-                edge_type = apply_prefix(row["blslot"]["value"]).split(":", 1)[1]
-                for kid in kids:
-                    edges[kid]["type"] = edge_type
+        for row in slot_response_by_qid.get(qid, []):
+            edge_type = apply_prefix(row["blslot"]["value"]).split(":", 1)[1]
+            for kid in kids:
+                edges[kid]["type"] = edge_type
     kgraph["edges"] = list(edges.values())
 
     return kgraph
 
 
-def get_evidence_query(source_id, pred, target_id):
-    """Generate query to get text-mined evidence that asserts the edge."""
+def get_evidence_keys(response, qgraph):
+    """Get the (source type, predicate, target type) triples of the response edges."""
+    return {
+        (
+            row[f"{qedge['source_id']}_type"]["value"],
+            row[qedge["id"]]["value"],
+            row[f"{qedge['target_id']}_type"]["value"],
+        )
+        for row in response
+        for qedge in qgraph["edges"]
+    }
+
+
+def get_evidence_query(triples=None):
+    """Generate query to get text-mined evidence that asserts the edges.
+
+    Each triple is a (source type, predicate, target type) tuple of full IRIs.
+    Without triples, the query gets all evidence.
+    """
     query = ""
     for key, value in PREFIXES.items():
         query += f"PREFIX {key}: <{value}>\n"
+    values = ""
+    if triples is not None:
+        values = " ".join(
+            [f"( <{source}> <{pred}> <{target}> )" for source, pred, target in triples]
+        )
+        values = f"  VALUES (?subj_type ?pred ?obj_type) {{ {values} }}\n"
     return (
         query
-        + "select ?assoc ?publications ?score ?sentence ?subject_spans ?object_spans ?provided_by {\n"
-        f"  ?subj <http://www.openrdf.org/schema/sesame#directType> {source_id} .\n"
+        + "select ?subj_type ?pred ?obj_type ?assoc ?publications ?score ?sentence ?subject_spans ?object_spans ?provided_by {\n"
+        + values
+        + "  ?subj <http://www.openrdf.org/schema/sesame#directType> ?subj_type .\n"
         "  ?assoc <https://w3id.org/biolink/vocab/subject> ?subj .\n"
         "  ?assoc <https://w3id.org/biolink/vocab/object> ?obj .\n"
-        f"  ?obj <http://www.openrdf.org/schema/sesame#directType> {target_id} .\n"
-        f"  ?assoc <https://w3id.org/biolink/vocab/relation> <{pred}> .\n"
+        "  ?obj <http://www.openrdf.org/schema/sesame#directType> ?obj_type .\n"
+        "  ?assoc <https://w3id.org/biolink/vocab/relation> ?pred .\n"
         "  ?assoc <https://w3id.org/biolink/vocab/evidence> ?evidence .\n"
         "  ?evidence <https://w3id.org/biolink/vocab/publications> ?publications .\n"
         "  ?evidence <https://w3id.org/biolink/vocab/sentence> ?sentence .\n"
@@ -308,6 +502,53 @@ def get_evidence_query(source_id, pred, target_id):
     )
 
 
+async def fetch_evidence(triples):
+    """Get text-mined evidence for many edges with a few batched queries.
+
+    Returns a map from (source type, predicate, target type) to a list of
+    provenance dicts, in backend order.
+    """
+    triples = list(triples)
+    chunks = [
+        triples[idx : idx + EVIDENCE_BATCH_SIZE]
+        for idx in range(0, len(triples), EVIDENCE_BATCH_SIZE)
+    ]
+    with stage("evidence_query"):
+        responses = await asyncio.gather(
+            *[
+                or_truncated(
+                    run_query(get_evidence_query(chunk), priority=PRIORITY_EVIDENCE),
+                    [],
+                )
+                for chunk in chunks
+            ]
+        )
+
+    # for each evidence add score, sentence, etc.
+    evidence = defaultdict(list)
+    for bindings in responses:
+        for binding in bindings:
+            key = (
+                binding["subj_type"]["value"],
+                binding["pred"]["value"],
+                binding["obj_type"]["value"],
+            )
+            evidence[key].append(get_provenance(binding))
+    return evidence
+
+
+def get_provenance(binding):
+    """Get the provenance dict of an evidence query binding."""
+    return {
+        "publication": binding["publications"]["value"],
+        "score": float(binding["score"]["value"]),
+        "sentence": binding["sentence"]["value"],
+        "subject_spans": binding["subject_spans"]["value"],
+        "object_spans": binding["object_spans"]["value"],
+        "provided_by": binding["provided_by"]["value"],
+    }
+
+
 # def get_CAM_query(src, pred, obj):
 #     """Generate query to get asserted CAM including triple."""
 #     query = ""
@@ -1,19 +1,38 @@
 """Utilities."""
+import asyncio
+import base64
+import binascii
 from collections import defaultdict
 import copy
+from functools import lru_cache
 import hashlib
 import json
 import re
+import time
 
-import httpx
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from core.backends import BACKEND
+from core.deadlines import (
+    DEADLINE,
+    Deadline,
+    DeadlineExceeded,
+    check_deadline,
+    remaining,
+    truncate,
+)
+from core.metrics import (
+    BACKEND_QUERIES,
+    BACKEND_QUERY_SECONDS,
+    BACKEND_ROWS,
+)
+from core.profiling import CALL, start_call
+from core.scheduler import SCHEDULER, PRIORITY_DETAIL
+from core.slowlog import record_query
 
-# "backend" matches the Docker container name for the container with the Blazegraph instance
-# "assoc" is the namespace/repository name where the triples have loaded
-BLAZEGRAPH_URL = "http://backend:9999/blazegraph/namespace/assoc/sparql"
-BLAZEGRAPH_HEADERS = {
-    "content-type": "application/sparql-query",
-    "Accept": "application/json",
-}
 PREFIXES = {
     "BFO": "http://purl.obolibrary.org/obo/BFO_",
     "BIOGRID": "http://thebiogrid.org/",
@@ -131,6 +150,29 @@ def hash_dict(_dict):
     return hashlib.sha256(json.dumps(_dict).encode("utf-8")).hexdigest()
 
 
+def dump_json(obj):
+    """Serialize to JSON bytes, with orjson if it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def encode_cursor(cursor):
+    """Encode a dict as an opaque, URL-safe continuation token."""
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token):
+    """Decode a continuation token made by encode_cursor."""
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError(f"Invalid cursor: {token}")
+    if not isinstance(cursor, dict):
+        raise ValueError(f"Invalid cursor: {token}")
+    return cursor
+
+
 def snake_to_pascal(string):
     """Convert snake-case string to pascal-case."""
     return string[0].upper() + re.sub(
@@ -145,21 +187,70 @@ def pascal_to_snake(string):
     )
 
 
+class PrefixMap:
+    """Longest-match converter between IRIs and CURIEs.
+
+    Namespaces are bucketed by length so that compressing an IRI costs one
+    dict lookup per distinct namespace length, longest first. The longest
+    matching namespace wins; among prefixes sharing a namespace, the first
+    one declared wins.
+    """
+
+    def __init__(self, prefixes, cache_size=2**16):
+        """Compile the prefix map."""
+        self.prefixes = dict(prefixes)
+        buckets = defaultdict(dict)
+        for short, long in self.prefixes.items():
+            buckets[len(long)].setdefault(long, short)
+        self.buckets = sorted(buckets.items(), reverse=True)
+        self.compress = lru_cache(maxsize=cache_size)(self._compress)
+        self.expand = lru_cache(maxsize=cache_size)(self._expand)
+
+    def _compress(self, iri):
+        """Compress an IRI to a CURIE, if any namespace matches."""
+        for length, namespaces in self.buckets:
+            short = namespaces.get(iri[:length], None)
+            if short is not None:
+                return short + ":" + iri[length:]
+        return iri
+
+    def _expand(self, curie):
+        """Expand a CURIE to a full IRI, if its prefix is known."""
+        parts = curie.split(":", 1)
+        if len(parts) > 1 and parts[0] in self.prefixes:
+            return self.prefixes[parts[0]] + parts[1]
+        return curie
+
+    def compress_all(self, iris):
+        """Compress a list of IRIs to CURIEs."""
+        return [self.compress(iri) for iri in iris]
+
+    def expand_all(self, curies):
+        """Expand a list of CURIEs to full IRIs."""
+        return [self.expand(curie) for curie in curies]
+
+
+PREFIX_MAP = PrefixMap(PREFIXES)
+
+
 def apply_prefix(string):
-    """Apply the last matching prefix."""
-    for short, long in PREFIXES.items():
-        if string.startswith(long):
-            return short + ":" + string[len(long) :]
-    return string
+    """Apply the longest matching prefix."""
+    return PREFIX_MAP.compress(string)
+
+
+def apply_prefixes(strings):
+    """Apply the longest matching prefix to each string."""
+    return PREFIX_MAP.compress_all(strings)
 
 
 def unprefix(curie):
     """Expand a CURIE to a full URI."""
-    parts = curie.split(":", 1)
-    if len(parts) > 1 and parts[0] in PREFIXES:
-        return PREFIXES.get(parts[0]) + parts[1]
-    else:
-        return curie
+    return PREFIX_MAP.expand(curie)
+
+
+def unprefix_all(curies):
+    """Expand each CURIE to a full URI."""
+    return PREFIX_MAP.expand_all(curies)
 
 
 BIG_NUMBER = 99999
@@ -195,13 +286,167 @@ def trim_qgraph(qgraph):
     # TODO: remove orphaned nodes
 
 
-async def run_query(query):
-    """Run SPARQL query on Blazegraph database."""
-    async with httpx.AsyncClient(timeout=None) as client:
-        response = await client.post(
-            BLAZEGRAPH_URL,
-            headers=BLAZEGRAPH_HEADERS,
-            data=query,
+# backend requests in flight by query text, shared by concurrent callers
+IN_FLIGHT = {}
+# number of callers waiting for each backend request in flight
+WAITERS = {}
+# deadline of each backend request in flight, the latest of its callers'
+REQUEST_DEADLINES = {}
+QUERY_STATS = {"coalesced": 0}
+
+
+async def run_query(query, priority=PRIORITY_DETAIL, results_format=None):
+    """Run SPARQL query on the backend.
+
+    Concurrent calls with the same query text share one backend request and
+    its bindings, which callers must not modify. A caller stops waiting with
+    DeadlineExceeded when its deadline passes, and the backend request is
+    cancelled once no caller is waiting for it. The backend stops the request
+    at the latest deadline of its callers, or never if one of them has none.
+
+    results_format picks the transfer format of the results, "json", "tsv"
+    or "csv" (SPARQL_RESULTS_FORMAT by default); the bindings look the same.
+    """
+    check_deadline()
+    deadline = DEADLINE.get()
+    key = (query, results_format)
+    task = IN_FLIGHT.get(key, None)
+    if task is None:
+        # the request runs in its own task, under a deadline of its own
+        shared = None if deadline is None else Deadline(deadline.remaining())
+        token = DEADLINE.set(shared)
+        try:
+            task = asyncio.ensure_future(post_query(query, priority, results_format))
+        finally:
+            DEADLINE.reset(token)
+        IN_FLIGHT[key] = task
+        REQUEST_DEADLINES[task] = shared
+        task.add_done_callback(lambda _: forget_query(key, task))
+    else:
+        QUERY_STATS["coalesced"] += 1
+        start_call(priority, coalesced=True)
+        shared = REQUEST_DEADLINES.get(task, None)
+        if shared is not None:
+            # only counts if the request has not been sent yet
+            shared.extend(deadline)
+    WAITERS[task] = WAITERS.get(task, 0) + 1
+    try:
+        # a caller going away must not cancel the request for the others
+        return await asyncio.wait_for(asyncio.shield(task), remaining())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("The query deadline has passed")
+    finally:
+        WAITERS[task] -= 1
+        if not WAITERS[task]:
+            del WAITERS[task]
+            if not task.done():
+                # nobody is waiting any more
+                forget_query(key, task)
+                task.cancel()
+
+
+def forget_query(key, task):
+    """Stop sharing the backend request for a query and results format."""
+    if IN_FLIGHT.get(key, None) is task:
+        del IN_FLIGHT[key]
+    REQUEST_DEADLINES.pop(task, None)
+
+
+async def post_query(query, priority=PRIORITY_DETAIL, results_format=None):
+    """Send SPARQL query to the backend and return the bindings."""
+    BACKEND_QUERIES.inc()
+    # the call is only seen by this query
+    call = start_call(priority)
+    CALL.set(call)
+    bindings = []
+    status = "failed"
+    queued = time.perf_counter()
+    # when the backend got the query, once a slot was free
+    start = None
+    try:
+        async with SCHEDULER.slot(priority):
+            start = time.perf_counter()
+            # the time the backend is given, however long the callers wait
+            limit = remaining()
+            try:
+                bindings = await BACKEND.query(query, results_format)
+            except Exception as err:
+                if limit is not None and time.perf_counter() - start >= limit:
+                    raise DeadlineExceeded("The backend query ran out of time") from err
+                raise
+        status = "ok"
+    except DeadlineExceeded:
+        status = "cancelled"
+        raise
+    except asyncio.CancelledError:
+        # no caller is waiting any more
+        status = "cancelled"
+        raise
+    finally:
+        end = time.perf_counter()
+        elapsed = end - queued
+        BACKEND_QUERY_SECONDS.observe(elapsed)
+        BACKEND_ROWS.inc(len(bindings))
+        if call is not None:
+            call["seconds"] = elapsed
+            call["rows"] = len(bindings)
+        # only the time spent on the backend, as for stream_query
+        record_query(
+            query, 0.0 if start is None else end - start, len(bindings), status
         )
-    assert response.status_code < 300
-    return response.json()["results"]["bindings"]
+    return bindings
+
+
+async def stream_query(query, priority=PRIORITY_DETAIL, results_format=None):
+    """Run SPARQL query on the backend, yielding bindings as they arrive.
+
+    If the deadline passes, the query is cancelled and the answer being
+    built is marked as truncated.
+    """
+    BACKEND_QUERIES.inc()
+    call = start_call(priority, streamed=True)
+    CALL.set(call)
+    rows = 0
+    # only the time spent waiting for the backend
+    waited = 0.0
+    status = "failed"
+    try:
+        with BACKEND_QUERY_SECONDS.time():
+            async with SCHEDULER.slot(priority, timeout=remaining()):
+                start = time.perf_counter()
+                bindings = BACKEND.stream(query, results_format)
+                try:
+                    async for binding in bindings:
+                        check_deadline()
+                        rows += 1
+                        waited += time.perf_counter() - start
+                        yield binding
+                        start = time.perf_counter()
+                finally:
+                    await bindings.aclose()
+            waited += time.perf_counter() - start
+        status = "ok"
+    except (DeadlineExceeded, asyncio.TimeoutError):
+        # answer with the rows so far
+        status = "cancelled"
+        truncate()
+    except (asyncio.CancelledError, GeneratorExit):
+        status = "cancelled"
+        raise
+    finally:
+        BACKEND_ROWS.inc(rows)
+        if call is not None:
+            call["seconds"] = waited
+            call["rows"] = rows
+        CALL.set(None)
+        record_query(query, waited, rows, status)
+
+
+async def aiterate(rows):
+    """Iterate asynchronously over a list or an async iterator of rows."""
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
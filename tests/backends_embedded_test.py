@@ -0,0 +1,58 @@
+from api.server import execute_query
+from core.backends import EmbeddedBackend, pyoxigraph
+from core.slot_mapping import load_slot_mapping
+from nose.tools import eq_
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+import asyncio
+import copy
+import json
+
+with open("examples/chebi-pr-regulation.json") as f:
+    example = json.load(f)
+
+
+@skipIf(pyoxigraph is None, "pyoxigraph is not installed")
+class TestEmbeddedBackend(TestCase):
+    def answer(self, strict):
+        "answer the example query from the sample data"
+
+        async def main():
+            backend = EmbeddedBackend(["backend/sample.nt", "backend/slot-mapping.nt"])
+            with patch("core.utilities.BACKEND", backend), patch.dict(
+                "core.slot_mapping.SLOT_MAPPING"
+            ):
+                await load_slot_mapping()
+                return await execute_query(
+                    copy.deepcopy(example["message"]), strict=strict
+                )
+
+        return asyncio.run(main())
+
+    def test_literals(self):
+        backend = EmbeddedBackend(["backend/sample.nt"])
+        bindings = asyncio.run(
+            backend.query(
+                "SELECT ?label WHERE { "
+                "<http://purl.obolibrary.org/obo/CHEBI_3215> "
+                "<http://www.w3.org/2000/01/rdf-schema#label> ?label }"
+            )
+        )
+        eq_(
+            [{"label": {"type": "literal", "value": "bupivacaine", "xml:lang": "en"}}],
+            bindings,
+        )
+
+    def test_example(self):
+        for strict in [True, False]:
+            message = self.answer(strict)
+            eq_(1, len(message["results"]))
+            eq_(
+                ["CHEBI:3215", "PR:000031567"],
+                [node["id"] for node in message["knowledge_graph"]["nodes"]],
+            )
+            eq_(
+                "negatively_regulates_entity_to_entity",
+                message["knowledge_graph"]["edges"][0]["type"],
+            )
+            eq_(["PMID:29085514"], message["provenance"]["publications"])
@@ -0,0 +1,57 @@
+from core.backends import iter_bindings
+from nose.tools import eq_, assert_raises
+import asyncio
+import json
+
+
+results = {
+    "head": {"vars": ["bindings", "n0_type", "label"]},
+    "results": {
+        "bindings": [
+            {
+                "n0_type": {
+                    "type": "uri",
+                    "value": "http://purl.obolibrary.org/obo/CHEBI_3215",
+                },
+                "label": {"type": "literal", "value": "bupivacaïne [1], {x}"},
+            },
+            {
+                "n0_type": {
+                    "type": "uri",
+                    "value": "http://purl.obolibrary.org/obo/PR_000031567",
+                },
+                "label": {"type": "literal", "value": 'say "hi" \\ ]'},
+            },
+        ]
+    },
+}
+
+
+async def chunked(body, size):
+    for idx in range(0, len(body), size):
+        yield body[idx : idx + size]
+
+
+async def collect(body, size):
+    return [binding async for binding in iter_bindings(chunked(body, size))]
+
+
+def test_iter_bindings():
+    body = json.dumps(results, indent=2).encode("utf-8")
+    for size in [1, 2, 7, 64, len(body)]:
+        eq_(
+            results["results"]["bindings"],
+            asyncio.run(collect(body, size)),
+            f"Bindings not as expected for {size}-byte chunks",
+        )
+
+
+def test_iter_bindings_empty():
+    body = json.dumps({"head": {"vars": []}, "results": {"bindings": []}})
+    eq_([], asyncio.run(collect(body.encode("utf-8"), 3)))
+
+
+def test_iter_bindings_truncated():
+    body = json.dumps(results).encode("utf-8")[:-40]
+    with assert_raises(ValueError):
+        asyncio.run(collect(body, 16))
@@ -0,0 +1,77 @@
+from core.backends import ReplicaSetBackend
+from nose.tools import eq_
+from unittest.mock import patch
+import asyncio
+import httpx
+
+URLS = [
+    f"http://replica{idx}:9999/blazegraph/namespace/assoc/sparql" for idx in range(3)
+]
+BINDINGS = {"results": {"bindings": [{"x": {"type": "literal", "value": "1"}}]}}
+
+
+class StandIn:
+    """Replicas answering through mock transports, which can be taken down."""
+
+    def __init__(self):
+        self.down = set()
+        self.served = []
+
+    def client(self, host):
+        async def handle(request):
+            if host in self.down:
+                return httpx.Response(503)
+            if request.content != b"ASK {}":
+                self.served.append(host)
+                await asyncio.sleep(0.01)
+            return httpx.Response(200, json=BINDINGS)
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(handle))
+
+    def clients(self):
+        return {f"replica{idx}:9999": self.client(f"replica{idx}") for idx in range(3)}
+
+
+def test_least_outstanding():
+    """Test that concurrent queries are spread over the replicas."""
+    stand_in = StandIn()
+
+    async def run():
+        backend = ReplicaSetBackend(URLS)
+        return backend, await asyncio.gather(
+            *[backend.query(f"SELECT {idx}") for idx in range(3)]
+        )
+
+    with patch.dict("core.backends.CLIENTS", stand_in.clients(), clear=True):
+        backend, results = asyncio.run(run())
+    eq_([BINDINGS["results"]["bindings"]] * 3, results)
+    eq_(["replica0", "replica1", "replica2"], sorted(stand_in.served))
+    for stats in backend.replica_stats():
+        eq_(1, stats["requests"])
+        eq_(0, stats["outstanding"])
+        assert stats["mean_seconds"] > 0
+
+
+def test_eject_and_readmit():
+    """Test that a failing replica gets no queries until it recovers."""
+    stand_in = StandIn()
+    stand_in.down.add("replica1")
+
+    async def run():
+        backend = ReplicaSetBackend(URLS)
+        for _ in range(3):
+            await backend.check_all()
+        ejected = backend.stats()
+        for idx in range(6):
+            await backend.query(f"SELECT {idx}")
+        stand_in.down.clear()
+        await backend.check_all()
+        return ejected, backend.stats()
+
+    with patch.dict("core.backends.CLIENTS", stand_in.clients(), clear=True), patch(
+        "core.backends.BLAZEGRAPH_EJECT_AFTER", 3
+    ):
+        ejected, readmitted = asyncio.run(run())
+    eq_({"replicas": 3, "healthy_replicas": 2}, ejected)
+    assert "replica1" not in stand_in.served
+    eq_({"replicas": 3, "healthy_replicas": 3}, readmitted)
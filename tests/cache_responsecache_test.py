@@ -0,0 +1,50 @@
+from core.cache import ResponseCache
+from nose.tools import eq_
+from unittest.mock import patch
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2, max_bytes=1000, ttl=60)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    eq_("1", cache.get("a"))
+    cache.put("c", "3")  # evicts b, the least recently used
+
+    eq_(None, cache.get("b"))
+    eq_("1", cache.get("a"))
+    eq_("3", cache.get("c"))
+    eq_({"entries": 2, "bytes": 2, "hits": 3, "misses": 1}, cache.stats())
+
+
+def test_size_bound():
+    cache = ResponseCache(max_entries=10, max_bytes=10, ttl=60)
+    cache.put("a", "x" * 6)
+    cache.put("b", "y" * 6)  # evicts a to stay under 10 bytes
+    cache.put("c", "z" * 11)  # larger than the whole cache, not stored
+
+    eq_(None, cache.get("a"))
+    eq_("y" * 6, cache.get("b"))
+    eq_(None, cache.get("c"))
+    eq_(6, cache.stats()["bytes"])
+
+
+@patch("core.cache.time.monotonic")
+def test_ttl_expiry(mock_thing):
+    cache = ResponseCache(max_entries=10, max_bytes=1000, ttl=60)
+    mock_thing.return_value = 100.0
+    cache.put("a", "1")
+    mock_thing.return_value = 159.0
+    eq_("1", cache.get("a"))
+    mock_thing.return_value = 161.0
+    eq_(None, cache.get("a"))
+    eq_(0, cache.stats()["entries"])
+
+
+def test_purge():
+    cache = ResponseCache(max_entries=10, max_bytes=1000, ttl=60)
+    cache.put("a", "1")
+    cache.put("b", "2")
+
+    eq_(2, cache.purge())
+    eq_(None, cache.get("a"))
+    eq_({"entries": 0, "bytes": 0, "hits": 0, "misses": 1}, cache.stats())
@@ -0,0 +1,59 @@
+from core.jobs import JobManager, DONE, FAILED, PENDING
+from core.scheduler import Overloaded
+from nose.tools import eq_, assert_raises
+from unittest.mock import patch
+import asyncio
+
+
+async def double(value):
+    await asyncio.sleep(0)
+    return 2 * value
+
+
+async def fail():
+    raise ValueError("bad query")
+
+
+def test_jobs_run():
+    async def main():
+        jobs = JobManager(workers=2, max_queued=10, retention=60)
+        jobs.start()
+        ok = jobs.submit(double, 21)
+        failed = jobs.submit(fail)
+        await jobs.queue.join()
+        await jobs.stop()
+        return jobs.get(ok), jobs.get(failed)
+
+    ok, failed = asyncio.run(main())
+    eq_(DONE, ok["status"])
+    eq_(42, ok["result"])
+    eq_(FAILED, failed["status"])
+    eq_("bad query", failed["error"])
+
+
+def test_queue_bound():
+    async def main():
+        jobs = JobManager(workers=0, max_queued=1, retention=60)
+        jobs.start()
+        job_id = jobs.submit(double, 1)
+        with assert_raises(Overloaded):
+            jobs.submit(double, 2)
+        eq_(PENDING, jobs.get(job_id)["status"])
+        eq_(1, len(jobs.jobs))
+
+    asyncio.run(main())
+
+
+def test_retention():
+    async def main():
+        jobs = JobManager(workers=1, max_queued=10, retention=60)
+        jobs.start()
+        job_id = jobs.submit(double, 1)
+        await jobs.queue.join()
+        await jobs.stop()
+        eq_(DONE, jobs.get(job_id)["status"])
+        finished = jobs.get(job_id)["finished"]
+        with patch("core.jobs.time.time", lambda: finished + 61):
+            eq_(None, jobs.get(job_id))
+
+    asyncio.run(main())
@@ -0,0 +1,39 @@
+from core.metrics import Counter, Gauges, Histogram, render
+from nose.tools import eq_
+from unittest.mock import patch
+
+
+@patch("core.metrics.REGISTRY", [])
+def test_render():
+    counter = Counter("rows_total", "Rows")
+    histogram = Histogram("stage_seconds", "Stages", ("stage",), buckets=(0.1, 1))
+    Gauges("cache", "Cache", lambda: {"hits": 3})
+    counter.inc(2)
+    counter.inc()
+    histogram.observe(0.05, "parse")
+    histogram.observe(0.5, "parse")
+    histogram.observe(5, "parse")
+    eq_(
+        render(),
+        "# HELP rows_total Rows\n"
+        "# TYPE rows_total counter\n"
+        "rows_total 3\n"
+        "# HELP stage_seconds Stages\n"
+        "# TYPE stage_seconds histogram\n"
+        'stage_seconds_bucket{stage="parse",le="0.1"} 1\n'
+        'stage_seconds_bucket{stage="parse",le="1"} 2\n'
+        'stage_seconds_bucket{stage="parse",le="+Inf"} 3\n'
+        'stage_seconds_sum{stage="parse"} 5.55\n'
+        'stage_seconds_count{stage="parse"} 3\n'
+        "# HELP cache_hits Cache (hits)\n"
+        "# TYPE cache_hits gauge\n"
+        "cache_hits 3\n",
+    )
+
+
+@patch("core.metrics.REGISTRY", [])
+def test_time():
+    histogram = Histogram("stage_seconds", "Stages", ("stage",))
+    with histogram.time("build_query"):
+        pass
+    eq_(1, sum(histogram.series[("build_query",)][0]))
@@ -0,0 +1,68 @@
+from core.backends import EmbeddedBackend, pyoxigraph
+from core.onehop import OneHopIndex, load_onehop, answer_onehop, numpy, ONEHOP
+from core.slot_mapping import load_slot_mapping
+from core.transpile import build_query, parse_response
+from nose.tools import eq_
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+import asyncio
+import copy
+import json
+
+with open("examples/chebi-pr-regulation.json") as f:
+    example = json.load(f)
+
+qgraph = example["message"]["query_graph"]
+
+# the example with one end open
+qgraph_type_only = copy.deepcopy(qgraph)
+del qgraph_type_only["nodes"][1]["curie"]
+
+# the example asking for the wrong relation
+qgraph_other_relation = copy.deepcopy(qgraph)
+qgraph_other_relation["edges"][0]["type"] = "positively_regulates_entity_to_entity"
+
+
+@skipIf(numpy is None or pyoxigraph is None, "numpy or pyoxigraph is not installed")
+class TestOneHopIndex(TestCase):
+    def parse_both(self, qgraph):
+        "parse the answers from SPARQL and from the index"
+
+        async def main():
+            backend = EmbeddedBackend(["backend/sample.nt", "backend/slot-mapping.nt"])
+            with patch("core.utilities.BACKEND", backend), patch.dict(
+                "core.slot_mapping.SLOT_MAPPING"
+            ), patch.dict(ONEHOP):
+                await load_slot_mapping()
+                await load_onehop()
+                rows, evidence = answer_onehop(qgraph)
+                onehop = await parse_response(rows, qgraph, evidence=evidence)
+                response = await backend.query(await build_query(qgraph))
+                sparql = await parse_response(response, qgraph)
+            return onehop, sparql
+
+        return asyncio.run(main())
+
+    def test_same_as_sparql(self):
+        for qgraph_ in [qgraph, qgraph_type_only, qgraph_other_relation]:
+            onehop, sparql = self.parse_both(qgraph_)
+            eq_(sparql, onehop)
+        eq_(1, len(self.parse_both(qgraph)[1][1]))
+
+    def test_unsupported(self):
+        two_hop = {
+            "nodes": qgraph["nodes"] + [{"id": "n2", "type": "gene_product"}],
+            "edges": qgraph["edges"]
+            + [
+                {
+                    "id": "e1",
+                    "source_id": "n0",
+                    "target_id": "n2",
+                    "type": "negatively_regulates_entity_to_entity",
+                }
+            ],
+        }
+        with patch.dict(ONEHOP, {"index": OneHopIndex([], [], [])}):
+            eq_(None, answer_onehop(qgraph, strict=False))
+            eq_(None, answer_onehop(two_hop))
+            eq_(([], {}), answer_onehop(qgraph))
@@ -0,0 +1,72 @@
+from core.planner import Pattern, plan_patterns, STATISTICS
+from core.transpile import build_query
+from nose.tools import eq_
+import asyncio
+from unittest.mock import patch
+from unittest import TestCase
+
+statistics = {
+    "instances": 1000,
+    "classes": {
+        "https://w3id.org/biolink/vocab/ChemicalSubstance": 200,
+        "https://w3id.org/biolink/vocab/Gene": 10,
+    },
+    "predicates": {"http://purl.obolibrary.org/obo/RO_0002212": 50},
+}
+
+qgraph = {
+    "nodes": [
+        {"id": "n0", "type": "chemical_substance"},
+        {"id": "n1", "type": "gene", "curie": "PR:000031567"},
+    ],
+    "edges": [
+        {
+            "id": "e0",
+            "source_id": "n0",
+            "target_id": "n1",
+            "type": "negatively_regulates_entity_to_entity",
+        }
+    ],
+}
+
+
+class TestPlanPatterns(TestCase):
+    def test_no_statistics(self):
+        patterns = [Pattern("a", {"x"}, 10), Pattern("b", {"y"}, 1)]
+        with patch.dict(STATISTICS, {"instances": 0}):
+            eq_(plan_patterns(patterns), (patterns, False))
+
+    def test_selective_first(self):
+        a = Pattern("a", {"x"}, 100)
+        b = Pattern("b", {"x", "e", "y"}, 500)
+        c = Pattern("c", {"y"}, 1)
+        values = Pattern("v", {"e"}, 2, values=True)
+        with patch.dict(STATISTICS, statistics):
+            ordered, planned = plan_patterns([a, values, b, c])
+        eq_(planned, True)
+        # c is cheapest, then b is the only pattern connected to it
+        eq_(ordered, [c, values, b, a])
+
+
+class TestBuildQueryPlan(TestCase):
+    @patch(
+        "core.transpile.get_slot_predicates",
+        lambda slot: ["http://purl.obolibrary.org/obo/RO_0002212"],
+    )
+    def test_pinned_curie_first(self):
+        with patch.dict(STATISTICS, {"instances": 0}):
+            unplanned = asyncio.run(build_query(qgraph))
+        with patch.dict(STATISTICS, statistics):
+            planned = asyncio.run(build_query(qgraph))
+        body = planned.split("WHERE {\n")[1].splitlines()
+        eq_(body[0], "?n1 rdf:type PR:000031567 .")
+        # the same patterns, reordered
+        eq_(sorted(planned.splitlines()), sorted(unplanned.splitlines()))
+
+    @patch("core.transpile.QUERY_JOIN_HINTS", True)
+    @patch("core.transpile.get_slot_predicates", lambda slot: [])
+    def test_join_hints(self):
+        with patch.dict(STATISTICS, statistics):
+            query = asyncio.run(build_query(qgraph))
+        assert "PREFIX hint: <http://www.bigdata.com/queryHints#>\n" in query
+        assert 'hint:Query hint:optimizer "None" .\n' in query
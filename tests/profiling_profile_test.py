@@ -0,0 +1,65 @@
+from api.server import app
+from core.backends import EmbeddedBackend, pyoxigraph
+from core.profiling import Profile
+from core.slot_mapping import load_slot_mapping
+from fastapi.testclient import TestClient
+from nose.tools import eq_
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+import asyncio
+import json
+
+with open("examples/chebi-pr-regulation.json") as f:
+    example = json.load(f)
+
+
+def test_breakdown():
+    profile = Profile()
+    profile.add_stage("parse_response", 3.0)
+    profile.add_stage("evidence_query", 1.0)
+    call = profile.add_call(0, streamed=True)
+    call.update(seconds=0.5, rows=10, bytes=100)
+    profile.add_call(1, coalesced=True)
+    breakdown = profile.dict()
+    eq_(1, breakdown["backend"]["queries"])
+    eq_(1, breakdown["backend"]["coalesced"])
+    eq_(10, breakdown["backend"]["rows"])
+    eq_(
+        {"seconds": 3.0, "backend_seconds": 1.5, "parse_seconds": 1.5},
+        breakdown["parse_response"],
+    )
+
+
+@skipIf(pyoxigraph is None, "pyoxigraph is not installed")
+class TestProfile(TestCase):
+    def test_profile(self):
+        backend = EmbeddedBackend(["backend/sample.nt", "backend/slot-mapping.nt"])
+        with patch("core.utilities.BACKEND", backend), patch.dict(
+            "core.slot_mapping.SLOT_MAPPING"
+        ):
+            asyncio.run(load_slot_mapping())
+            client = TestClient(app)
+            plain = client.post("/query", json=example).json()
+            profiled = client.post(
+                "/query", params={"profile": True}, json=example
+            ).json()
+
+        eq_(None, plain["profile"])
+        profile = profiled.pop("profile")
+        plain.pop("profile")
+        eq_(plain, profiled)
+        eq_(
+            {
+                "build_query",
+                "parse_response",
+                "evidence_query",
+                "get_details",
+                "detail_query",
+                "parse_kgraph",
+            },
+            set(profile["stages"]),
+        )
+        # main, evidence and detail queries
+        eq_(3, profile["backend"]["queries"])
+        eq_([True, False, False], [c["streamed"] for c in profile["backend"]["calls"]])
+        eq_(1, profile["backend"]["calls"][0]["rows"])
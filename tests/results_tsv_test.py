@@ -0,0 +1,92 @@
+from core.backends import HttpBackend
+from core.results import iter_csv_bindings, iter_tsv_bindings
+from nose.tools import eq_
+from unittest.mock import patch
+import asyncio
+import httpx
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+CHEBI = "http://purl.obolibrary.org/obo/CHEBI_3215"
+
+tsv = (
+    "?n0_type\t?label\t?count\t?n0\n"
+    f'<{CHEBI}>\t"bupivacaïne\\t[1], \\"x\\"\\n"@en\t42\t_:b0\n'
+    f'<{CHEBI}>\t"0.99"^^<{XSD}float>\t1.5e3\t\n'
+)
+tsv_bindings = [
+    {
+        "n0_type": {"type": "uri", "value": CHEBI},
+        "label": {
+            "type": "literal",
+            "value": 'bupivacaïne\t[1], "x"\n',
+            "xml:lang": "en",
+        },
+        "count": {"type": "literal", "value": "42", "datatype": XSD + "integer"},
+        "n0": {"type": "bnode", "value": "b0"},
+    },
+    {
+        "n0_type": {"type": "uri", "value": CHEBI},
+        "label": {"type": "literal", "value": "0.99", "datatype": XSD + "float"},
+        "count": {"type": "literal", "value": "1.5e3", "datatype": XSD + "double"},
+    },
+]
+
+csv = (
+    "n0_type,label,n0\r\n"
+    f'{CHEBI},"bupivacaïne\r\n[1], ""x""",_:b0\r\n'
+    f"{CHEBI},plain text,\r\n"
+)
+csv_bindings = [
+    {
+        "n0_type": {"type": "uri", "value": CHEBI},
+        "label": {"type": "literal", "value": 'bupivacaïne\r\n[1], "x"'},
+        "n0": {"type": "bnode", "value": "b0"},
+    },
+    {
+        "n0_type": {"type": "uri", "value": CHEBI},
+        "label": {"type": "literal", "value": "plain text"},
+    },
+]
+
+
+async def chunked(body, size):
+    for idx in range(0, len(body), size):
+        yield body[idx : idx + size]
+
+
+def collect(parse, body, size):
+    async def run():
+        return [binding async for binding in parse(chunked(body, size))]
+
+    return asyncio.run(run())
+
+
+def test_iter_tsv_bindings():
+    body = tsv.encode("utf-8")
+    # split anywhere, including inside multi-byte characters
+    for size in [1, 2, 7, len(body)]:
+        eq_(tsv_bindings, collect(iter_tsv_bindings, body, size))
+
+
+def test_iter_csv_bindings():
+    body = csv.encode("utf-8")
+    for size in [1, 2, 7, len(body)]:
+        eq_(csv_bindings, collect(iter_csv_bindings, body, size))
+
+
+def test_negotiate_format():
+    """Test that the backend asks for the format and gets the same bindings."""
+    accepted = []
+
+    def handle(request):
+        accepted.append(request.headers["accept"])
+        return httpx.Response(200, content=tsv.encode("utf-8"))
+
+    async def run():
+        backend = HttpBackend("http://backend:9999/sparql")
+        return await backend.query("SELECT *", results_format="tsv")
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    with patch.dict("core.backends.CLIENTS", {"backend:9999": client}, clear=True):
+        eq_(tsv_bindings, asyncio.run(run()))
+    eq_(["text/tab-separated-values"], accepted)
@@ -0,0 +1,65 @@
+from core.scheduler import QueryScheduler, Overloaded
+from nose.tools import eq_, assert_raises
+import asyncio
+
+
+async def run_in_order(priorities):
+    "hold the only slot while the queries queue up, then record the order they run in"
+    scheduler = QueryScheduler(max_in_flight=1, max_queued=10)
+    order = []
+
+    async def query(name, priority):
+        async with scheduler.slot(priority):
+            order.append(name)
+
+    await scheduler.acquire(0)
+    tasks = []
+    for name, priority in priorities:
+        tasks.append(asyncio.create_task(query(name, priority)))
+        await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    eq_({"in_flight": 0, "queued": 0}, scheduler.stats())
+    return order
+
+
+def test_priority():
+    order = asyncio.run(
+        run_in_order([("evidence0", 1), ("main0", 0), ("detail0", 1), ("main1", 0)])
+    )
+    eq_(["main0", "main1", "evidence0", "detail0"], order)
+
+
+def test_max_in_flight():
+    async def run():
+        scheduler = QueryScheduler(max_in_flight=3, max_queued=10)
+        peak = 0
+
+        async def query():
+            nonlocal peak
+            async with scheduler.slot(1):
+                peak = max(peak, scheduler.in_flight)
+                await asyncio.sleep(0.001)
+
+        await asyncio.gather(*[query() for _ in range(20)])
+        return peak
+
+    eq_(3, asyncio.run(run()))
+
+
+def test_admit():
+    async def run():
+        scheduler = QueryScheduler(max_in_flight=1, max_queued=2)
+        await scheduler.acquire(0)
+        scheduler.admit()
+        waiters = [asyncio.create_task(scheduler.acquire(0)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with assert_raises(Overloaded):
+            scheduler.admit()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        scheduler.admit()
+        eq_({"in_flight": 1, "queued": 0}, scheduler.stats())
+
+    asyncio.run(run())
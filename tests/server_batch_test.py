@@ -0,0 +1,75 @@
+from api.models import Message
+from api.server import app, QUERY_CACHE
+from fastapi.testclient import TestClient
+from nose.tools import eq_
+from unittest.mock import patch
+import copy
+
+from server_fastresponse_test import (
+    example,
+    slot_mapping,
+    query_response,
+    run_query,
+    stream_query,
+)
+
+# the example answered for a second CURIE that has no answers
+other_example = copy.deepcopy(example)
+other_example["message"]["query_graph"]["nodes"][0]["curie"] = "CHEBI:9999"
+
+batch_response = [
+    {
+        **row,
+        "n0_curie": {
+            "type": "uri",
+            "value": "http://purl.obolibrary.org/obo/CHEBI_3215",
+        },
+        "n1_curie": {
+            "type": "uri",
+            "value": "http://purl.obolibrary.org/obo/PR_000031567",
+        },
+    }
+    for row in query_response
+]
+
+
+def test_batch_matches_single_queries():
+    queries = []
+
+    async def run_batch_query(query, **kwargs):
+        queries.append(query)
+        if "_curie" in query:
+            return batch_response
+        return await run_query(query, **kwargs)
+
+    QUERY_CACHE.purge()
+    with patch("core.transpile.run_query", run_batch_query), patch(
+        "api.server.run_query", run_batch_query
+    ), patch("api.server.stream_query", stream_query), patch.dict(
+        "core.slot_mapping.SLOT_MAPPING", slot_mapping
+    ):
+        client = TestClient(app)
+        batch = client.post("/query/batch", json=[example, other_example])
+        eq_(200, batch.status_code)
+        # one main query, one evidence query and one detail query
+        eq_(3, len(queries))
+        assert "VALUES (?n0_curie ?n1_curie)" in queries[0]
+
+        QUERY_CACHE.purge()
+        single = client.post("/query", json=example)
+
+    messages = [Message.parse_obj(message) for message in batch.json()]
+    eq_(Message.parse_raw(single.content).dict(), messages[0].dict())
+    eq_(0, len(messages[1].results))
+
+
+def test_batch_rejects_curie_lists():
+    """Test that nodes with lists of CURIEs are rejected, not run."""
+    list_example = copy.deepcopy(example)
+    list_example["message"]["query_graph"]["nodes"][0]["curie"] = [
+        "CHEBI:3215",
+        "CHEBI:9999",
+    ]
+    client = TestClient(app)
+    response = client.post("/query/batch", json=[example, list_example])
+    eq_(400, response.status_code)
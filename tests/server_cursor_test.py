@@ -0,0 +1,26 @@
+from api.server import app
+from core.utilities import encode_cursor, hash_dict
+from fastapi.testclient import TestClient
+from nose.tools import eq_
+
+from server_fastresponse_test import example
+
+
+def test_forged_cursor():
+    """Test that cursors with bad pages are rejected, not run."""
+    query_id = hash_dict(
+        {"query_graph": example["message"]["query_graph"], "strict": True}
+    )
+    client = TestClient(app)
+    for page in [
+        {"offset": 3.5, "limit": 5},
+        {"offset": "3", "limit": 5},
+        {"offset": -1, "limit": 5},
+        {"offset": 0, "limit": 0},
+        {"offset": 0, "limit": True},
+        {"offset": 0},
+        {"limit": 5},
+    ]:
+        cursor = encode_cursor({"query": query_id, **page})
+        response = client.post("/query", params={"cursor": cursor}, json=example)
+        eq_(400, response.status_code, page)
@@ -0,0 +1,36 @@
+from api.models import Message
+from api.server import app, QUERY_CACHE
+from fastapi.testclient import TestClient
+from nose.tools import eq_
+from unittest.mock import patch
+import asyncio
+
+from server_fastresponse_test import example, run_query, slot_mapping, stream_query
+
+
+async def post_query(query, priority, results_format=None):
+    # the detail query takes too long
+    if "?blclass" in query:
+        await asyncio.sleep(1)
+    return await run_query(query)
+
+
+def test_deadline_truncates():
+    """Test that the answer found before the deadline is returned, uncached."""
+    QUERY_CACHE.purge()
+    with patch("core.utilities.post_query", post_query), patch(
+        "api.server.stream_query", stream_query
+    ), patch.dict("core.slot_mapping.SLOT_MAPPING", slot_mapping):
+        response = TestClient(app).post("/query", params={"timeout": 0.2}, json=example)
+    eq_(200, response.status_code)
+    message = Message.parse_raw(response.content)
+    assert message.truncated
+    eq_(1, len(message.results))
+    # no node details
+    eq_(None, message.knowledge_graph.nodes[0].name)
+    eq_(0, QUERY_CACHE.stats()["entries"])
+
+
+def test_timeout_must_be_positive():
+    response = TestClient(app).post("/query", params={"timeout": 0}, json=example)
+    eq_(400, response.status_code)
@@ -0,0 +1,104 @@
+from api.models import Message
+from api.server import app, QUERY_CACHE
+from core.slot_mapping import index_slot_mapping
+from fastapi.testclient import TestClient
+from nose.tools import eq_
+from unittest.mock import patch
+import json
+
+with open("examples/chebi-pr-regulation.json") as f:
+    example = json.load(f)
+
+slot_mapping = index_slot_mapping(
+    [
+        {
+            "slot": {
+                "value": "https://w3id.org/biolink/vocab/negatively_regulates_entity_to_entity"
+            },
+            "predicate": {"value": "http://purl.obolibrary.org/obo/RO_0002212"},
+            "label": {"value": "negatively regulates"},
+        }
+    ]
+)
+
+query_response = [
+    {
+        "e0": {"type": "uri", "value": "http://purl.obolibrary.org/obo/RO_0002212"},
+        "n0": {"type": "uri", "value": "_:IjbFtUdgNQk-HHlsBju-I_jpSnA_subj"},
+        "n0_type": {
+            "type": "uri",
+            "value": "http://purl.obolibrary.org/obo/CHEBI_3215",
+        },
+        "n1": {"type": "uri", "value": "_:IjbFtUdgNQk-HHlsBju-I_jpSnA_obj"},
+        "n1_type": {
+            "type": "uri",
+            "value": "http://purl.obolibrary.org/obo/PR_000031567",
+        },
+    }
+]
+
+evidence_response = [
+    {
+        "subj_type": {"value": "http://purl.obolibrary.org/obo/CHEBI_3215"},
+        "pred": {"value": "http://purl.obolibrary.org/obo/RO_0002212"},
+        "obj_type": {"value": "http://purl.obolibrary.org/obo/PR_000031567"},
+        "publications": {"value": "PMID:29085514"},
+        "score": {"value": "0.99956816"},
+        "sentence": {"value": "bupivacaine suppressed LRRC3B"},
+        "subject_spans": {"value": "start: 0, end: 11"},
+        "object_spans": {"value": "start: 23, end: 29"},
+        "provided_by": {"value": "TMProvider"},
+    }
+]
+
+detail_response = [
+    {
+        "kid": {"value": "http://purl.obolibrary.org/obo/CHEBI_3215"},
+        "blclass": {"value": "https://w3id.org/biolink/vocab/ChemicalSubstance"},
+        "label": {"value": "bupivacaine"},
+    },
+    {
+        "kid": {"value": "http://purl.obolibrary.org/obo/PR_000031567"},
+        "blclass": {"value": "https://w3id.org/biolink/vocab/GeneProduct"},
+    },
+]
+
+
+async def run_query(query, **kwargs):
+    if "?subj_type" in query:
+        return evidence_response
+    if "?blclass" in query:
+        return detail_response
+    return query_response
+
+
+async def stream_query(query, **kwargs):
+    for row in query_response:
+        yield row
+
+
+def post_query(params):
+    "answer the example query against the mocked backend, bypassing the cache"
+    QUERY_CACHE.purge()
+    with patch("core.transpile.run_query", run_query), patch(
+        "api.server.run_query", run_query
+    ), patch("api.server.stream_query", stream_query), patch.dict(
+        "core.slot_mapping.SLOT_MAPPING", slot_mapping
+    ):
+        response = TestClient(app).post("/query", params=params, json=example)
+    eq_(200, response.status_code)
+    return response
+
+
+def test_fast_response_matches_schema():
+    for params in [{}, {"limit": 1, "offset": 0}]:
+        slow = post_query(params)
+        fast = post_query({**params, "fast": True})
+
+        eq_("application/json", fast.headers["content-type"])
+        eq_(
+            Message.parse_raw(slow.content).dict(),
+            Message.parse_raw(fast.content).dict(),
+            "Fast response not equivalent to the validated response",
+        )
+        eq_(1, len(Message.parse_raw(fast.content).results))
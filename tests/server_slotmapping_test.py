@@ -0,0 +1,41 @@
+from api.server import QUERY_CACHE, app, refresh_slot_mapping_in_background
+from fastapi.testclient import TestClient
+from nose.tools import eq_
+from unittest.mock import patch
+import asyncio
+
+from server_fastresponse_test import example
+
+
+def test_slot_mapping_retried():
+    """Test that the slot mapping is loaded once the backend is ready."""
+    attempts = []
+
+    async def load_slot_mapping():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise ConnectionError("Blazegraph is starting")
+        if len(attempts) == 2:
+            # up, but the data is not loaded yet
+            return {"predicates": {}, "slots": {}, "labels": {}}
+        return {"predicates": {"slot": ["predicate"]}, "slots": {}, "labels": {}}
+
+    QUERY_CACHE.put("empty answer", b"{}")
+    with patch("api.server.load_slot_mapping", load_slot_mapping), patch(
+        "api.server.SLOT_MAPPING_RETRY_SECONDS", 0
+    ):
+        asyncio.run(refresh_slot_mapping_in_background())
+    eq_(3, len(attempts))
+    # answers cached while the mapping was loading are dropped
+    eq_(None, QUERY_CACHE.get("empty answer"))
+
+
+def test_not_ready():
+    """Test that queries are turned away until the slot mapping is loaded."""
+    QUERY_CACHE.purge()
+    client = TestClient(app)
+    with patch.dict("core.slot_mapping.SLOT_MAPPING", {"predicates": {}}):
+        for path, body in [("/query", example), ("/query/batch", [example])]:
+            response = client.post(path, json=body)
+            eq_(503, response.status_code, path)
+            assert "Retry-After" in response.headers
@@ -0,0 +1,55 @@
+from core.slot_mapping import index_slot_mapping
+from nose.tools import eq_
+
+
+# bindings as returned for backend/slot-mapping.nt
+bindings = [
+    {
+        "slot": {
+            "value": "https://w3id.org/biolink/vocab/negatively_regulates_entity_to_entity"
+        },
+        "predicate": {"value": "http://purl.obolibrary.org/obo/RO_0002212"},
+        "label": {"value": "negatively regulates"},
+    },
+    {
+        "slot": {"value": "https://w3id.org/biolink/vocab/negatively_regulates"},
+        "predicate": {"value": "http://purl.obolibrary.org/obo/RO_0002212"},
+        "label": {"value": "negatively regulates"},
+    },
+    {
+        "slot": {
+            "value": "https://w3id.org/biolink/vocab/positively_regulates_entity_to_entity"
+        },
+        "predicate": {"value": "http://purl.obolibrary.org/obo/RO_0002213"},
+    },
+]
+
+
+def test_index_slot_mapping():
+    mapping = index_slot_mapping(bindings)
+
+    expected_mapping = {
+        "predicates": {
+            "https://w3id.org/biolink/vocab/negatively_regulates_entity_to_entity": [
+                "http://purl.obolibrary.org/obo/RO_0002212"
+            ],
+            "https://w3id.org/biolink/vocab/negatively_regulates": [
+                "http://purl.obolibrary.org/obo/RO_0002212"
+            ],
+            "https://w3id.org/biolink/vocab/positively_regulates_entity_to_entity": [
+                "http://purl.obolibrary.org/obo/RO_0002213"
+            ],
+        },
+        "slots": {
+            "http://purl.obolibrary.org/obo/RO_0002212": [
+                "https://w3id.org/biolink/vocab/negatively_regulates_entity_to_entity",
+                "https://w3id.org/biolink/vocab/negatively_regulates",
+            ],
+            "http://purl.obolibrary.org/obo/RO_0002213": [
+                "https://w3id.org/biolink/vocab/positively_regulates_entity_to_entity"
+            ],
+        },
+        "labels": {"http://purl.obolibrary.org/obo/RO_0002212": "negatively regulates"},
+    }
+
+    eq_(expected_mapping, mapping, "Slot mapping not as expected")
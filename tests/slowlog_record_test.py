@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from nose.tools import eq_
+
+from core.slowlog import (
+    EXPLAINING,
+    QGRAPH,
+    close_slow_query_log,
+    open_slow_query_log,
+    record_query,
+)
+
+QGRAPH_EXAMPLE = {
+    "nodes": [{"id": "n0", "curie": "CHEBI:3215"}],
+    "edges": [],
+}
+
+
+def read_log(explain=False, plan_seconds=0, queries=(("SELECT slow", "ok"),)):
+    """Record a fast query and slow queries and read back the log."""
+
+    class Backend:
+        async def explain(self, query):
+            await asyncio.sleep(plan_seconds)
+            return f"<plan for {query}>"
+
+    async def run():
+        QGRAPH.set(QGRAPH_EXAMPLE)
+        record_query("SELECT fast", 0.5, 10)
+        for query, status in queries:
+            record_query(query, 2.0, 20, status)
+        await asyncio.gather(*EXPLAINING)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "slow.jsonl")
+        open_slow_query_log(path)
+        try:
+            with patch("core.slowlog.SLOW_QUERY_SECONDS", 1.0), patch(
+                "core.slowlog.SLOW_QUERY_EXPLAIN", explain
+            ), patch("core.slowlog.SLOW_QUERY_EXPLAIN_TIMEOUT", 0.1), patch(
+                "core.slowlog.BACKEND", Backend()
+            ):
+                asyncio.run(run())
+        finally:
+            close_slow_query_log()
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+
+def test_record():
+    """Test that only slow queries are logged, with their query graph."""
+    records = read_log()
+    eq_(len(records), 1)
+    eq_(records[0]["query"], "SELECT slow")
+    eq_(records[0]["seconds"], 2.0)
+    eq_(records[0]["rows"], 20)
+    eq_(records[0]["status"], "ok")
+    eq_(records[0]["query_graph"], QGRAPH_EXAMPLE)
+    assert "explain" not in records[0]
+
+
+def test_explain():
+    """Test that the query plan is logged when enabled."""
+    records = read_log(explain=True)
+    eq_(len(records), 1)
+    eq_(records[0]["explain"], "<plan for SELECT slow>")
+
+
+def test_failed():
+    """Test that failed and cancelled queries are logged with their status."""
+    records = read_log(
+        queries=(("SELECT failed", "failed"), ("SELECT cancelled", "cancelled"))
+    )
+    eq_([record["status"] for record in records], ["failed", "cancelled"])
+
+
+def test_explain_timeout():
+    """Test that a slow query plan is given up on."""
+    records = read_log(explain=True, plan_seconds=1)
+    eq_(len(records), 1)
+    eq_(records[0]["explain_error"], "Timed out")
+    assert "explain" not in records[0]
+
+
+def test_explain_max():
+    """Test that only so many queries are explained at once."""
+    queries = [(f"SELECT slow{i}", "ok") for i in range(3)]
+    with patch("core.slowlog.SLOW_QUERY_EXPLAIN_MAX", 2):
+        records = read_log(explain=True, queries=queries)
+    eq_(len(records), 3)
+    eq_(sorted("explain" in record for record in records), [False, True, True])
+
+
+def test_disabled():
+    """Test that nothing is recorded without a log file."""
+    with patch("core.slowlog.SLOW_QUERY_SECONDS", 0.0), patch(
+        "core.slowlog.write_record"
+    ) as write_record:
+        record_query("SELECT slow", 2.0, 20)
+    eq_(write_record.call_count, 0)
+
+
+def test_post_query_failed():
+    """Test that a backend query is recorded when it fails."""
+    from core.utilities import post_query
+
+    class Backend:
+        async def query(self, query, results_format=None):
+            raise RuntimeError("backend error")
+
+    with patch("core.utilities.BACKEND", Backend()), patch(
+        "core.utilities.record_query"
+    ) as record:
+        try:
+            asyncio.run(post_query("SELECT failed"))
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("the backend error was swallowed")
+    eq_(record.call_count, 1)
+    query, _, rows, status = record.call_args[0]
+    eq_((query, rows, status), ("SELECT failed", 0, "failed"))
+
+
+def test_post_query_queued():
+    """Test that the time waiting for a backend slot is not recorded."""
+    from contextlib import asynccontextmanager
+
+    from core.utilities import post_query
+
+    class Scheduler:
+        @asynccontextmanager
+        async def slot(self, priority, timeout=None):
+            await asyncio.sleep(0.2)
+            yield
+
+    class Backend:
+        async def query(self, query, results_format=None):
+            return [{}]
+
+    with patch("core.utilities.SCHEDULER", Scheduler()), patch(
+        "core.utilities.BACKEND", Backend()
+    ), patch("core.utilities.record_query") as record:
+        asyncio.run(post_query("SELECT queued"))
+    query, seconds, rows, status = record.call_args[0]
+    assert seconds < 0.1, seconds
+    eq_((query, rows, status), ("SELECT queued", 1, "ok"))
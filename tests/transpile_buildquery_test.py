@@ -154,15 +154,13 @@ def get_prefixes():
     return prequel
 
 
-# Note that the path to the run_query function must be from where it is loaded (core.transpile) not where it is defined (core.utilities)
+# Note that the path to the get_slot_predicates function must be from where it is loaded (core.transpile) not where it is defined (core.slot_mapping)
 class TestBuildQueryFullySpecified(TestCase):
 
     # test w/fully specified entity pair
-    @patch("core.transpile.run_query", new_callable=AsyncMock)
+    @patch("core.transpile.get_slot_predicates")
     def test_build_query(self, mock_thing):
-        mock_thing.return_value = [
-            {"predicate": {"value": "http://purl.obolibrary.org/obo/RO_0002212"}}
-        ]
+        mock_thing.return_value = ["http://purl.obolibrary.org/obo/RO_0002212"]
         strict = True
         sparql = asyncio.run(to_sparql(qgraph_fully_specified_entity_pair, strict))
 
@@ -182,11 +180,9 @@ VALUES ?e0 { <http://purl.obolibrary.org/obo/RO_0002212> }
 
 class TestBuildQueryTypeOnly(TestCase):
     # test w/type-only entity pair
-    @patch("core.transpile.run_query", new_callable=AsyncMock)
+    @patch("core.transpile.get_slot_predicates")
     def test_build_query(self, mock_thing):
-        mock_thing.return_value = [
-            {"predicate": {"value": "http://purl.obolibrary.org/obo/RO_0002212"}}
-        ]
+        mock_thing.return_value = ["http://purl.obolibrary.org/obo/RO_0002212"]
         strict = True
         sparql = asyncio.run(to_sparql(qgraph_type_only_entity_pair, strict))
 
@@ -206,11 +202,9 @@ VALUES ?e0 { <http://purl.obolibrary.org/obo/RO_0002212> }
 
 class TestBuildQueryCurieOnly(TestCase):
     # test w/curie-only entity pair
-    @patch("core.transpile.run_query", new_callable=AsyncMock)
+    @patch("core.transpile.get_slot_predicates")
     def test_build_query(self, mock_thing):
-        mock_thing.return_value = [
-            {"predicate": {"value": "http://purl.obolibrary.org/obo/RO_0002212"}}
-        ]
+        mock_thing.return_value = ["http://purl.obolibrary.org/obo/RO_0002212"]
         strict = True
         sparql = asyncio.run(to_sparql(qgraph_curie_only_entity_pair, strict))
 
@@ -230,11 +224,9 @@ VALUES ?e0 { <http://purl.obolibrary.org/obo/RO_0002212> }
 
 class TestBuildQueryOneTypeOneCurie(TestCase):
     # test w/one type & one curie entity pair
-    @patch("core.transpile.run_query", new_callable=AsyncMock)
+    @patch("core.transpile.get_slot_predicates")
     def test_build_query(self, mock_thing):
-        mock_thing.return_value = [
-            {"predicate": {"value": "http://purl.obolibrary.org/obo/RO_0002212"}}
-        ]
+        mock_thing.return_value = ["http://purl.obolibrary.org/obo/RO_0002212"]
         strict = True
         sparql = asyncio.run(to_sparql(qgraph_one_curie_one_type, strict))
 
@@ -255,11 +247,9 @@ VALUES ?e0 { <http://purl.obolibrary.org/obo/RO_0002212> }
 class TestBuildQueryOneTypeOneCurieNoEdge(TestCase):
     # test w/one type & one curie entity pair but no edge type specified
     @skip("# NOTE: this fails as the code expects an edge type")
-    @patch("core.transpile.run_query", new_callable=AsyncMock)
+    @patch("core.transpile.get_slot_predicates")
     def test_build_query(self, mock_thing):
-        mock_thing.return_value = [
-            {"predicate": {"value": "http://purl.obolibrary.org/obo/RO_0002212"}}
-        ]
+        mock_thing.return_value = ["http://purl.obolibrary.org/obo/RO_0002212"]
         strict = True
         sparql = asyncio.run(to_sparql(qgraph_one_curie_one_type_no_edge_type, strict))
 
@@ -282,11 +272,9 @@ VALUES ?e0 {  }
 
 class TestBuildQueryTwoHop(TestCase):
     # test w/two hop fully-specified
-    @patch("core.transpile.run_query", new_callable=AsyncMock)
+    @patch("core.transpile.get_slot_predicates")
     def test_build_query(self, mock_thing):
-        mock_thing.return_value = [
-            {"predicate": {"value": "http://purl.obolibrary.org/obo/RO_0002212"}}
-        ]
+        mock_thing.return_value = ["http://purl.obolibrary.org/obo/RO_0002212"]
         strict = True
         sparql = asyncio.run(to_sparql(qgraph_two_hop_fully_specified, strict))
 
@@ -309,3 +297,28 @@ VALUES ?e1 { <http://purl.obolibrary.org/obo/RO_0002212> }
         print("SPARQL: " + sparql)
         print("EXPECTED: " + expected_sparql)
         eq_(expected_sparql, sparql, "SPARQL not as expected")
+
+
+class TestBuildQueryPage(TestCase):
+    # test w/fully specified entity pair, one page of results
+    @patch("core.transpile.get_slot_predicates")
+    def test_build_query(self, mock_thing):
+        mock_thing.return_value = ["http://purl.obolibrary.org/obo/RO_0002212"]
+        sparql = asyncio.run(
+            build_query(
+                qgraph_fully_specified_entity_pair, strict=True, limit=10, offset=20
+            )
+        )
+
+        expected_sparql = (
+            get_prefixes()
+            + """SELECT DISTINCT ?e0 ?n0 ?n0_type ?n1 ?n1_type WHERE {
+  ?n0 sesame:directType ?n0_type .
+  ?n1 sesame:directType ?n1_type .
+VALUES ?e0 { <http://purl.obolibrary.org/obo/RO_0002212> }
+  ?n0 ?e0 ?n1 .
+?n0 rdf:type CHEBI:3215 .
+?n1 rdf:type PR:000031567 .
+} ORDER BY ?e0 ?n0 ?n0_type ?n1 ?n1_type OFFSET 20 LIMIT 10"""
+        )
+        eq_(expected_sparql, sparql, "SPARQL not as expected")
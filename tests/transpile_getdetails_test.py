@@ -5,6 +5,7 @@ from unittest.mock import MagicMock, patch
 from unittest import TestCase, skip
 from reasoner_validator import validate_Message, ValidationError
 from core.utilities import PREFIXES
+from core.slot_mapping import index_slot_mapping
 
 
 def get_prefixes():
@@ -32,8 +33,22 @@ kgraph = {
 }
 
 
+slot_mapping = index_slot_mapping(
+    [
+        {
+            "slot": {
+                "value": "https://w3id.org/biolink/vocab/negatively_regulates_entity_to_entity"
+            },
+            "predicate": {"value": "http://purl.obolibrary.org/obo/RO_0002212"},
+            "label": {"value": "negatively regulates"},
+        }
+    ]
+)
+
+
+@patch.dict("core.slot_mapping.SLOT_MAPPING", slot_mapping)
 def test_get_details():
-    detail_query, slot_query, node_map, edge_map = get_details(kgraph)
+    detail_query, slot_response, node_map, edge_map = get_details(kgraph)
 
     expected_detail_query = (
         get_prefixes()
@@ -48,23 +63,16 @@ OPTIONAL { ?kid rdfs:label ?label . }}"""
     # ?kid rdfs:subClassOf ?blclass .
     # ?blclass blml:is_a* bl:NamedThing .
     # OPTIONAL { ?kid rdfs:label ?label . }}
-    expected_slot_query = (
-        get_prefixes()
-        + """SELECT DISTINCT ?qid ?kid ?blslot ?label WHERE {
-VALUES (?kid ?qid) { ( <http://purl.obolibrary.org/obo/RO_0002212> "e0000" ) }
-?blslot <http://translator/text_mining_provider/slot_mapping> ?kid .
-OPTIONAL { ?kid rdfs:label ?label . }
-}"""
-    )
-
-    # SELECT DISTINCT ?qid ?kid ?blslot ?label WHERE {
-    # VALUES (?kid ?qid) { ( <http://purl.obolibrary.org/obo/RO_0002212> "e0000" ) }
-    # ?blslot <http://reasoner.renci.org/vocab/slot_mapping> ?kid .
-    # FILTER NOT EXISTS {
-    #         ?other <http://reasoner.renci.org/vocab/slot_mapping> ?kid .
-    #         ?other blml:is_a+/blml:mixins* ?blslot .
-    #     }OPTIONAL { ?kid rdfs:label ?label . }
-    # }
+    expected_slot_response = [
+        {
+            "qid": {"value": "e0000"},
+            "kid": {"value": "http://purl.obolibrary.org/obo/RO_0002212"},
+            "blslot": {
+                "value": "https://w3id.org/biolink/vocab/negatively_regulates_entity_to_entity"
+            },
+            "label": {"value": "negatively regulates"},
+        }
+    ]
 
     expected_node_map = {"n0000": "CHEBI:3215", "n0001": "PR:000031567"}
     expected_edge_map = {
@@ -73,14 +81,14 @@ OPTIONAL { ?kid rdfs:label ?label . }
 
     print("DETAIL QUERY: " + str(detail_query) + "\n\n")
     print("EXPECTED DETAIL QUERY: " + str(expected_detail_query) + "\n\n")
-    print("SLOT QUERY: " + str(slot_query) + "\n\n")
-    print("EXPECTED SLOT QUERY: " + str(expected_slot_query) + "\n\n")
+    print("SLOT RESPONSE: " + str(slot_response) + "\n\n")
+    print("EXPECTED SLOT RESPONSE: " + str(expected_slot_response) + "\n\n")
 
     print("NODE MAP: " + str(node_map) + "\n\n")
 
     print("EDGE MAP: " + str(edge_map) + "\n\n")
 
     eq_(expected_detail_query, detail_query, "Detail query not as expected")
-    eq_(expected_slot_query, slot_query, "Slot query not as expected")
+    eq_(expected_slot_response, slot_response, "Slot response not as expected")
     eq_(expected_node_map, node_map, "Node map not as expected")
     eq_(expected_edge_map, edge_map, "Edge map not as expected")
@@ -59,6 +59,9 @@ class TestParseResponseFromFullySpecified(TestCase):
     def test_build_query(self, mock_thing):
         mock_thing.return_value = [
             {
+                "subj_type": {"value": "http://purl.obolibrary.org/obo/CHEBI_3215"},
+                "pred": {"value": "http://purl.obolibrary.org/obo/RO_0002212"},
+                "obj_type": {"value": "http://purl.obolibrary.org/obo/PR_000031567"},
                 "publications": {"value": "PMID:29085514"},
                 "score": {"value": "0.99956816"},
                 "sentence": {
@@ -70,7 +73,7 @@ class TestParseResponseFromFullySpecified(TestCase):
             }
         ]
         strict = True
-        kgraph, results = asyncio.run(
+        kgraph, results, provenance = asyncio.run(
             to_resp(response, qgraph_fully_specified_entity_pair, strict)
         )
 
@@ -84,23 +87,28 @@ class TestParseResponseFromFullySpecified(TestCase):
                     {
                         "qg_id": "e0",
                         "kg_id": "c1065ac6f333c149fdfa1288aac06169b844e7b6af43536877e103e2a5089d37",
-                        "provenance": str(
-                            [
-                                {
-                                    "publication": "PMID:29085514",
-                                    "score": "0.99956816",
-                                    "sentence": "The administration of 50 ?g/ml bupivacaine promoted maximum breast cancer cell invasion, and suppressed LRRC3B mRNA expression in cells.",
-                                    "subject_spans": "start: 31, end: 42",
-                                    "object_spans": "start: 104, end: 110",
-                                    "provided_by": "TMProvider",
-                                }
-                            ]
-                        ),
+                        "provenance": [
+                            {
+                                "publication": 0,
+                                "score": 0.99956816,
+                                "sentence": 0,
+                                "subject_spans": "start: 31, end: 42",
+                                "object_spans": "start: 104, end: 110",
+                                "provided_by": "TMProvider",
+                            }
+                        ],
                     }
                 ],
             }
         ]
 
+        expected_provenance = {
+            "publications": ["PMID:29085514"],
+            "sentences": [
+                "The administration of 50 ?g/ml bupivacaine promoted maximum breast cancer cell invasion, and suppressed LRRC3B mRNA expression in cells."
+            ],
+        }
+
         expected_kgraph = {
             "nodes": {
                 "CHEBI:3215": {"id": "CHEBI:3215"},
@@ -122,6 +130,7 @@ class TestParseResponseFromFullySpecified(TestCase):
 
         eq_(expected_results, results, "Results not as expected")
         eq_(expected_kgraph, kgraph, "KGraph not as expected")
+        eq_(expected_provenance, provenance, "Provenance not as expected")
 
         r = [
             {
@@ -189,3 +198,75 @@ class TestParseResponseFromFullySpecified(TestCase):
                 },
             },
         ]
+
+
+class TestParseResponseBatchesEvidence(TestCase):
+
+    # test that rows sharing an edge are resolved with a single evidence query
+    @patch("core.transpile.run_query", new_callable=AsyncMock)
+    def test_parse_response(self, mock_thing):
+        mock_thing.return_value = [
+            {
+                "subj_type": {"value": "http://purl.obolibrary.org/obo/CHEBI_3215"},
+                "pred": {"value": "http://purl.obolibrary.org/obo/RO_0002212"},
+                "obj_type": {"value": "http://purl.obolibrary.org/obo/PR_000031567"},
+                "publications": {"value": "PMID:29085514"},
+                "score": {"value": "0.99956816"},
+                "sentence": {"value": "bupivacaine suppressed LRRC3B"},
+                "subject_spans": {"value": "start: 0, end: 11"},
+                "object_spans": {"value": "start: 23, end: 29"},
+                "provided_by": {"value": "TMProvider"},
+            }
+        ]
+        strict = True
+        kgraph, results, provenance = asyncio.run(
+            to_resp(response * 3, qgraph_fully_specified_entity_pair, strict)
+        )
+
+        eq_(1, mock_thing.call_count, "Evidence not fetched in one query")
+        eq_(3, len(results), "Results not as expected")
+        for result in results:
+            eq_(
+                [
+                    {
+                        "publication": 0,
+                        "score": 0.99956816,
+                        "sentence": 0,
+                        "subject_spans": "start: 0, end: 11",
+                        "object_spans": "start: 23, end: 29",
+                        "provided_by": "TMProvider",
+                    }
+                ],
+                result["edge_bindings"][0]["provenance"],
+                "Provenance not as expected",
+            )
+        eq_(
+            {
+                "publications": ["PMID:29085514"],
+                "sentences": ["bupivacaine suppressed LRRC3B"],
+            },
+            provenance,
+            "Provenance table not as expected",
+        )
+
+
+async def stream(rows):
+    for row in rows:
+        yield row
+
+
+class TestParseResponseFromStream(TestCase):
+
+    # test that streamed rows parse the same as a list of rows
+    @patch("core.transpile.run_query", new_callable=AsyncMock)
+    def test_parse_response(self, mock_thing):
+        mock_thing.return_value = []
+        strict = True
+        expected = asyncio.run(
+            to_resp(response, qgraph_fully_specified_entity_pair, strict)
+        )
+        streamed = asyncio.run(
+            to_resp(stream(response), qgraph_fully_specified_entity_pair, strict)
+        )
+
+        eq_(expected, streamed, "Streamed response not parsed as expected")
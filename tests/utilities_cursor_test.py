@@ -0,0 +1,16 @@
+from core.utilities import encode_cursor, decode_cursor
+from nose.tools import eq_, assert_raises
+
+
+def test_cursor_round_trip():
+    cursor = {"query": "6a421c7f", "offset": 100, "limit": 50}
+    token = encode_cursor(cursor)
+
+    eq_(str, type(token))
+    eq_(cursor, decode_cursor(token))
+
+
+def test_invalid_cursor():
+    for token in ["abc", "not a cursor!", encode_cursor([1, 2])]:
+        with assert_raises(ValueError):
+            decode_cursor(token)
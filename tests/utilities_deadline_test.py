@@ -0,0 +1,131 @@
+from core.deadlines import DEADLINE, Deadline, DeadlineExceeded, remaining, truncated
+from core.utilities import post_query, run_query, stream_query, IN_FLIGHT, WAITERS
+from nose.tools import eq_, assert_raises
+from unittest.mock import patch
+import asyncio
+
+
+def slow_post_query(events):
+    """Get a post_query that takes 0.1 s, recording whether it finished."""
+
+    async def post_query(query, priority, results_format=None):
+        try:
+            await asyncio.sleep(0.1)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        events.append("finished")
+        return [{"query": {"value": query}}]
+
+    return post_query
+
+
+async def run_with_deadline(seconds, query="SELECT 1"):
+    DEADLINE.set(None if seconds is None else Deadline(seconds))
+    return await run_query(query)
+
+
+def test_deadline_cancels_query():
+    """Test that the backend query is cancelled when its caller runs out of time."""
+    events = []
+
+    async def run():
+        with assert_raises(DeadlineExceeded):
+            await run_with_deadline(0.01)
+        # let the cancellation go through
+        await asyncio.sleep(0)
+
+    with patch("core.utilities.post_query", slow_post_query(events)):
+        asyncio.run(run())
+    eq_(["cancelled"], events)
+    eq_({}, IN_FLIGHT)
+    eq_({}, WAITERS)
+
+
+def test_shared_query_outlives_waiter():
+    """Test that a shared query keeps running while someone waits for it."""
+    events = []
+
+    async def run():
+        return await asyncio.gather(
+            run_with_deadline(0.01),
+            run_with_deadline(None),
+            return_exceptions=True,
+        )
+
+    with patch("core.utilities.post_query", slow_post_query(events)):
+        short, unbounded = asyncio.run(run())
+    assert isinstance(short, DeadlineExceeded)
+    eq_([{"query": {"value": "SELECT 1"}}], unbounded)
+    eq_(["finished"], events)
+    eq_({}, IN_FLIGHT)
+    eq_({}, WAITERS)
+
+
+def test_stream_truncated():
+    """Test that a streamed query stops at the deadline, keeping its rows."""
+
+    class Backend:
+        async def stream(self, query, results_format=None):
+            for idx in range(10):
+                await asyncio.sleep(0.02)
+                yield {"idx": {"value": str(idx)}}
+
+    async def run():
+        DEADLINE.set(Deadline(0.05))
+        rows = [row async for row in stream_query("SELECT ?idx")]
+        return rows, truncated()
+
+    with patch("core.utilities.BACKEND", Backend()):
+        rows, is_truncated = asyncio.run(run())
+    assert 0 < len(rows) < 10
+    assert is_truncated
+
+
+def shared_query_limits(*seconds):
+    """Get the time the backend is given for a query shared by callers."""
+    limits = []
+
+    class Backend:
+        async def query(self, query, results_format=None):
+            limits.append(remaining())
+            await asyncio.sleep(0.1)
+            return [{"query": {"value": query}}]
+
+    async def run():
+        return await asyncio.gather(
+            *[run_with_deadline(each) for each in seconds],
+            return_exceptions=True,
+        )
+
+    with patch("core.utilities.BACKEND", Backend()):
+        asyncio.run(run())
+    return limits
+
+
+def test_shared_query_latest_deadline():
+    """Test that a shared query is bound by the latest deadline of its callers."""
+    (limit,) = shared_query_limits(0.01, 0.5)
+    assert 0.4 < limit <= 0.5, limit
+
+
+def test_shared_query_no_deadline():
+    """Test that a shared query is not bound if one of its callers is not."""
+    eq_([None], shared_query_limits(0.01, None))
+
+
+def test_shared_query_out_of_time():
+    """Test that a query cut off by the backend counts as out of time."""
+
+    class Backend:
+        async def query(self, query, results_format=None):
+            await asyncio.sleep(remaining())
+            raise RuntimeError("Query timed out")
+
+    async def run():
+        DEADLINE.set(Deadline(0.01))
+        await post_query("SELECT 1")
+
+    with patch("core.utilities.BACKEND", Backend()):
+        with assert_raises(DeadlineExceeded):
+            asyncio.run(run())
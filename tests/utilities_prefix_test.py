@@ -0,0 +1,50 @@
+from core.utilities import (
+    PrefixMap,
+    apply_prefix,
+    unprefix,
+    apply_prefixes,
+    unprefix_all,
+)
+from nose.tools import eq_
+
+prefix_map = PrefixMap(
+    {
+        "obo": "http://purl.obolibrary.org/obo/",
+        "GO": "http://purl.obolibrary.org/obo/GO_",
+        "OIO": "http://www.geneontology.org/formats/oboInOwl#",
+        "go": "http://www.geneontology.org/formats/oboInOwl#",
+    }
+)
+
+
+def test_longest_match():
+    eq_("GO:0008150", prefix_map.compress("http://purl.obolibrary.org/obo/GO_0008150"))
+    eq_("obo:bfo.owl", prefix_map.compress("http://purl.obolibrary.org/obo/bfo.owl"))
+
+
+def test_first_declared_wins_ties():
+    eq_(
+        "OIO:hasExactSynonym",
+        prefix_map.compress(
+            "http://www.geneontology.org/formats/oboInOwl#hasExactSynonym"
+        ),
+    )
+
+
+def test_no_match():
+    eq_("_:b0", prefix_map.compress("_:b0"))
+    eq_("FOO:123", prefix_map.expand("FOO:123"))
+    eq_("nocolon", prefix_map.expand("nocolon"))
+
+
+def test_bulk():
+    iris = [
+        "http://purl.obolibrary.org/obo/CHEBI_3215",
+        "http://purl.obolibrary.org/obo/PR_000031567",
+        "https://w3id.org/biolink/biolinkml/meta/is_a",
+    ]
+    curies = ["CHEBI:3215", "PR:000031567", "blml:is_a"]
+    eq_(curies, apply_prefixes(iris))
+    eq_(iris, unprefix_all(curies))
+    eq_([apply_prefix(iri) for iri in iris], apply_prefixes(iris))
+    eq_([unprefix(curie) for curie in curies], unprefix_all(curies))
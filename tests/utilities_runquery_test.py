@@ -0,0 +1,30 @@
+from core.utilities import run_query, QUERY_STATS, IN_FLIGHT
+from nose.tools import eq_
+from unittest.mock import patch
+import asyncio
+
+
+# Note that post_query is patched where run_query looks it up (core.utilities)
+@patch.dict("core.utilities.QUERY_STATS", {"coalesced": 0})
+def test_run_query_coalesces():
+    calls = []
+
+    async def post_query(query, priority, results_format=None):
+        calls.append(query)
+        await asyncio.sleep(0.01)
+        return [{"query": {"value": query}}]
+
+    async def run():
+        return await asyncio.gather(
+            *[run_query("SELECT 1") for _ in range(5)],
+            run_query("SELECT 2"),
+        )
+
+    with patch("core.utilities.post_query", post_query):
+        results = asyncio.run(run())
+
+    eq_(["SELECT 1", "SELECT 2"], calls, "Queries not coalesced")
+    eq_([[{"query": {"value": "SELECT 1"}}]] * 5, results[:5])
+    eq_([{"query": {"value": "SELECT 2"}}], results[5])
+    eq_(4, QUERY_STATS["coalesced"])
+    eq_({}, IN_FLIGHT)